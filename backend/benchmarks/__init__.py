@@ -0,0 +1 @@
+# Empty file to mark directory as Python package 
@@ -0,0 +1,59 @@
+"""
+Deterministic fake site workers for benchmarks: synthetic record distributions and a
+related-entity graph derived from the identifier, with a configurable upstream latency.
+"""
+import random
+import time
+from typing import List
+
+from sites import SiteWorker
+from sites.types import RequestEntity, RecordArray, EntityInfo, EntityMetadata
+
+
+def synthetic_metrics(count: int, seed: int = 0, alpha: float = 1.2) -> RecordArray:
+    """`count` heavy tailed metrics (Pareto, like views or stars), the same for the same seed."""
+    rng = random.Random(seed)
+    records = RecordArray(metric_type="points")
+    for _ in range(count):
+        records.append(int(rng.paretovariate(alpha)) - 1)
+    return records
+
+
+class FakeSiteWorker(SiteWorker):
+    name = "bench_fake"
+    description = "Synthetic site for benchmarks"
+    index_description = "Synthetic index"
+    entity_name = "Accounts"
+    metric_name = "points"
+    primary_color = "gray"
+    secondary_color = "black"
+    # behaviour of the fake upstream
+    seed = 0
+    latency_seconds = 0.0  # per upstream call
+    population = 100_000  # distinct identifiers the related graph reaches
+    related_per_entity = 5
+    mean_records = 200
+    max_records = 20_000
+    pareto_alpha = 1.2
+
+    def _rng(self, identifier: str, purpose: str) -> random.Random:
+        return random.Random(f"{self.seed}:{purpose}:{identifier}")
+
+    def entity_info(self, entity: RequestEntity) -> EntityInfo:
+        time.sleep(self.latency_seconds)
+        rng = self._rng(entity.identifier, "records")
+        # record counts are heavy tailed too, a few accounts have most of the content
+        count = min(int(rng.expovariate(1 / self.mean_records)) + 1, self.max_records)
+        records = RecordArray(metric_type=self.metric_name)
+        for i in range(count):
+            records.append(int(rng.paretovariate(self.pareto_alpha)) - 1, link=f"https://example.com/{entity.identifier}/{i}")
+        return EntityInfo(records=records, metadata=EntityMetadata(identifier=entity.identifier, url=f"https://example.com/{entity.identifier}"))
+
+    def get_related_entities(self, entity: RequestEntity) -> List[RequestEntity]:
+        time.sleep(self.latency_seconds)
+        rng = self._rng(entity.identifier, "related")
+        # skewed towards low ids so popular accounts are reached from many others
+        return [
+            RequestEntity(type=self.name, identifier=f"fake_{int(self.population * rng.random() ** 3)}")
+            for _ in range(self.related_per_entity)
+        ]
@@ -0,0 +1,50 @@
+"""
+CPU benchmark of core.hindex.h_index against sorting the metrics, no database needed.
+
+Metrics are heavy tailed (Pareto, like views or stars) and the same for the same --seed,
+timings are the best of --repeat runs.
+
+    python -m benchmarks.hindex --sizes 1000 100000 1000000
+"""
+import argparse
+import json
+import time
+
+from core.hindex import h_index
+from benchmarks.fakes import synthetic_metrics
+from benchmarks.stats import sorted_h_index
+
+
+def best_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        timings.append((time.process_time() - start) * 1000)
+    return round(min(timings), 3)
+
+
+def run(sizes, repeat: int = 5, seed: int = 0, alpha: float = 1.2):
+    results = []
+    for size in sizes:
+        metrics = synthetic_metrics(size, seed=seed + size, alpha=alpha).metrics
+        assert h_index(metrics) == sorted_h_index(metrics)
+        results.append({
+            "metrics": size,
+            "h_index": h_index(metrics)[0],
+            "h_index_ms": best_ms(lambda: h_index(metrics), repeat),
+            "h_index_generator_ms": best_ms(lambda: h_index(metric for metric in metrics), repeat),
+            "sorted_ms": best_ms(lambda: sorted_h_index(metrics), repeat),
+            "sorted_generator_ms": best_ms(lambda: sorted_h_index(metric for metric in metrics), repeat),
+        })
+    return {"benchmark": "h_index", "alpha": alpha, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--alpha", type=float, default=1.2, help="Pareto shape, lower is heavier tailed")
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.repeat, args.seed, args.alpha), indent=2))
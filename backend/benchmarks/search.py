@@ -0,0 +1,135 @@
+"""
+Search latency benchmark for SiteWorker.search_entities.
+
+Seeds a throwaway site table (sites.bench_search) with synthetic identifiers and reports
+p50/p95/p99 latency of autocomplete queries as JSON. Point DB_URL at a scratch database.
+With --baseline the same queries are also timed the way search worked before the trigram
+index: an unanchored ILIKE without the index, which is dropped and recreated around it.
+
+    python -m benchmarks.search --rows 1000000 --queries 2000 --baseline
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+load_dotenv()
+
+from db.definitions import engine, async_engine
+from db.migrate import migrate
+from sites import SiteWorker
+from benchmarks.stats import summarize
+
+
+class BenchSearchWorker(SiteWorker):
+    name = "bench_search"
+    description = "Synthetic site for search benchmarks"
+    index_description = "Synthetic index"
+    entity_name = "Accounts"
+    metric_name = "points"
+    primary_color = "gray"
+    secondary_color = "black"
+
+    def entity_info(self, entity):
+        return None
+
+    def get_related_entities(self, entity):
+        return []
+
+
+def seed(worker: SiteWorker, rows: int, random_seed: float = None):
+    """
+    Fill the benchmark table with `rows` identifiers and a skewed index distribution.
+    With a `random_seed` (between -1 and 1) the indices are the same on every run.
+    """
+    table = worker.EntityModel.__table__
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {table.schema}.{table.name}"))
+        if random_seed is not None:
+            connection.execute(text("SELECT setseed(:seed)"), {"seed": random_seed})
+        connection.execute(text(f"""
+            INSERT INTO {table.schema}.{table.name} (identifier, index, total_metrics, last_updated_at)
+            SELECT 'user_' || substr(md5(i::text), 1, 12), floor(100 * power(random(), 4))::int, 0, now()
+            FROM generate_series(1, :rows) AS i
+            ON CONFLICT DO NOTHING
+        """), {"rows": rows})
+        connection.execute(text(f"ANALYZE {table.schema}.{table.name}"))
+
+
+def sample_queries(worker: SiteWorker, count: int):
+    """Prefixes and substrings of real identifiers, 1 to 8 characters long like a user typing."""
+    with Session(engine) as session:
+        identifiers = [row[0] for row in session.execute(text(
+            f"SELECT identifier FROM sites.{worker.name} TABLESAMPLE SYSTEM (1) LIMIT 1000"
+        ))]
+    queries = []
+    for _ in range(count):
+        identifier = random.choice(identifiers)
+        length = random.randint(1, 8)
+        start = 0 if random.random() < 0.5 else random.randint(0, len(identifier) - length)
+        queries.append(identifier[start:start + length])
+    return queries
+
+
+async def baseline_search(worker: SiteWorker, query: str, limit: int = 10):
+    """search_entities before the trigram index: a substring match for every query length."""
+    async with AsyncSession(async_engine) as session:
+        result = await session.execute(
+            select(worker.EntityModel)
+            .where(worker.EntityModel.identifier.ilike(f"%{query}%"))
+            .order_by(worker.EntityModel.index.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+
+async def measure(search, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await search(query, limit=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def measure_searches(worker: SiteWorker, queries, baseline: bool):
+    """Latencies of search_entities, and without the trigram index if `baseline`, in one event loop (the pool's)."""
+    report = summarize(await measure(worker.search_entities, queries), "queries")
+    if baseline:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP INDEX IF EXISTS sites.ix_{worker.name}_identifier_trgm"))
+        try:
+            report["baseline"] = summarize(await measure(
+                lambda query, limit: baseline_search(worker, query, limit), queries
+            ), "queries")
+        finally:
+            worker.ensure_schema()
+    return report
+
+
+def run(rows: int, queries: int, skip_seed: bool = False, baseline: bool = False):
+    worker = BenchSearchWorker()
+    migrate([worker])
+    if not skip_seed:
+        seed(worker, rows)
+    return {
+        "benchmark": "search_entities",
+        "rows": rows,
+        **asyncio.run(measure_searches(worker, sample_queries(worker, queries), baseline)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the rows from a previous run")
+    parser.add_argument("--baseline", action="store_true", help="also time the search without the trigram index")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.queries, args.skip_seed, args.baseline), indent=2))
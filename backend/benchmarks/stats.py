@@ -0,0 +1,27 @@
+"""Helpers shared by the benchmarks: latency summaries and the sort based h-index baseline."""
+from typing import Iterable, List, Tuple
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(latencies_ms: List[float], count_key: str = "requests") -> dict:
+    """Count, p50/p95/p99 and max of a list of latencies, in milliseconds rounded to the microsecond."""
+    return {
+        count_key: len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 0.50), 3),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 3),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 3),
+        "max_ms": round(max(latencies_ms), 3),
+    }
+
+
+def sorted_h_index(metrics: Iterable[int]) -> Tuple[int, int]:
+    """Baseline and reference (h-index, sum of metrics): sort, then scan for the first metric below its rank."""
+    ranked = sorted(metrics, reverse=True)
+    for i, metric in enumerate(ranked):
+        if metric < i + 1:
+            return i, sum(ranked)
+    return len(ranked), sum(ranked)
@@ -0,0 +1,182 @@
+"""
+End-to-end benchmark suite on deterministic fake site workers, reported as JSON.
+
+Measures calculate_h_index CPU time, crawl pool throughput against a fake upstream with
+the given latency, and the latency of the read endpoints over a seeded site table
+(sites.bench_fake). Point DB_URL at a scratch database, and leave REDIS_URL unset so the
+crawl frontier stays in process.
+
+    python -m benchmarks.suite --rows 100000 --crawl-entities 500 --latency 0.05 --output report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import main
+from db.migrate import migrate
+from core.cache import MemoryCache
+from core.rank import RankIndex
+from sites.types import RequestEntity
+from benchmarks.fakes import FakeSiteWorker, synthetic_metrics
+from benchmarks.search import seed, sample_queries
+from benchmarks.stats import summarize
+
+# routes only accept supported sites, so the fake is served under an existing site key (its table stays sites.bench_fake)
+SITE_KEY = "github"
+
+
+def bench_h_index(worker: FakeSiteWorker, sizes, repeat: int = 5):
+    """CPU time of calculate_h_index over synthetic RecordArrays."""
+    results = []
+    for size in sizes:
+        records = synthetic_metrics(size, seed=size)
+        wall, cpu = [], []
+        for _ in range(repeat):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            index, _ = worker.calculate_h_index(records)
+            wall.append((time.perf_counter() - wall_start) * 1000)
+            cpu.append((time.process_time() - cpu_start) * 1000)
+        results.append({
+            "records": size,
+            "h_index": index,
+            "wall_ms": round(min(wall), 3),
+            "cpu_ms": round(min(cpu), 3),
+        })
+    return results
+
+
+def bench_crawl(worker: FakeSiteWorker, entities: int, timeout: float):
+    """Entities crawled per second by the crawl pool, from `entities` queued ones and what they lead to."""
+    crawled_before = worker.throughput.total
+    worker.queue_entities([RequestEntity(type=worker.name, identifier=f"fake_{i}") for i in range(entities)])
+    start = time.perf_counter()
+    worker.start_queue_monitor()
+    while worker.throughput.total - crawled_before < entities and time.perf_counter() - start < timeout:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    worker.stop_queue_monitor()
+    crawled = worker.throughput.total - crawled_before
+    return {
+        "queued": entities,
+        "crawled": crawled,
+        "seconds": round(elapsed, 3),
+        "entities_per_second": round(crawled / elapsed, 3),
+        "fetch_workers": worker.fetch_workers,
+        "latency_seconds": worker.latency_seconds,
+        "timed_out": crawled < entities,
+    }
+
+
+async def asgi_get(app, url: str) -> int:
+    """GET `url` through the ASGI app in process (no network, no server) and return the status code."""
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure_endpoint(urls):
+    latencies, errors = [], 0
+    for url in urls:
+        start = time.perf_counter()
+        status = await asgi_get(main.app, url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        errors += status != 200
+    return {**summarize(latencies), "errors": errors}
+
+
+async def bench_endpoints(worker: FakeSiteWorker, rows: int, requests: int):
+    queries = sample_queries(worker, requests)
+    deep_page = max(rows // 10 // 2, 1)
+    results = {
+        "ranking_first_page": await measure_endpoint([f"/{SITE_KEY}/ranking/1/10"] * requests),
+        "ranking_deep_page": await measure_endpoint([f"/{SITE_KEY}/ranking/{deep_page}/10"] * requests),
+        "ranking_cursor": await measure_endpoint([f"/{SITE_KEY}/ranking/10"] * requests),
+        "search": await measure_endpoint([f"/{SITE_KEY}/search/{query}" for query in queries]),
+        "supported_sites": await measure_endpoint(["/supported-sites"] * requests),
+    }
+    # stored entities, first looked up (entity cache miss) then again (hit)
+    main.state['entity_cache'] = MemoryCache()
+    ranked, _ = await worker.get_top_entities(1, requests)
+    urls = [f"/{SITE_KEY}/{entity.identifier}" for entity in ranked]
+    results["entity_uncached"] = await measure_endpoint(urls)
+    results["entity_cached"] = await measure_endpoint(urls)
+    return results
+
+
+def run(args):
+    random.seed(args.seed)
+    FakeSiteWorker.seed = args.seed
+    FakeSiteWorker.latency_seconds = args.latency
+    FakeSiteWorker.fetch_workers = args.fetch_workers
+    worker = FakeSiteWorker()
+    migrate([worker])
+
+    report = {
+        "benchmark": "suite",
+        "started_at": datetime.now().isoformat(),
+        "config": {**vars(args), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "h_index": bench_h_index(worker, args.h_index_sizes),
+        "crawl": bench_crawl(worker, args.crawl_entities, args.crawl_timeout),
+    }
+
+    if not args.skip_seed:
+        seed(worker, args.rows, random_seed=args.seed / 2 ** 31)
+    worker.rank_index = RankIndex()  # the seeded table replaced what the crawl wrote
+    worker.refresh_metadata()
+
+    main.state['site_workers'] = {SITE_KEY: worker}
+    main.state['entity_cache'] = MemoryCache()
+    main.state['executor'] = ThreadPoolExecutor(max_workers=main.REQUEST_EXECUTOR_WORKERS, thread_name_prefix="request")
+    main.limiter.enabled = False  # measuring the endpoints, not the rate limiter
+    try:
+        report["endpoints"] = asyncio.run(bench_endpoints(worker, args.rows, args.requests))
+    finally:
+        main.state['executor'].shutdown(wait=False)
+    report["rows"] = args.rows
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="rows seeded into the site table (10k to 1M)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--crawl-entities", type=int, default=500)
+    parser.add_argument("--crawl-timeout", type=float, default=120)
+    parser.add_argument("--fetch-workers", type=int, default=FakeSiteWorker.fetch_workers)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake upstream call")
+    parser.add_argument("--h-index-sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the rows from a previous run")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from redis import Redis
+
+from core.redis_client import get_redis
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 10000))
+
+
+def request_key(call_type: str, *parts) -> str:
+    """Cache key of an upstream call, hashed so credentials in URLs never end up in the cache."""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{call_type}:{digest}"
+
+
+class ResponseCache(ABC):
+    """
+    Cache of upstream API responses with a TTL per entry. None is never cached, so a
+    None from get() is always a miss. Hits and misses are counted for crawl_stats.
+    """
+
+    def __init__(self):
+        self._stats_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any], ttl: float) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "size": self.size(),
+            }
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU bounded to `max_entries`, expired entries are dropped when read or evicted."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = Lock()
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float):
+        if value is None or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisCache(ResponseCache):
+    """
+    Cache shared between replicas, values are stored as JSON under `cache:{namespace}:` keys.
+    Entries are tracked in a sorted set of their expiry times, trimmed on every set: expired
+    members are dropped and beyond `max_entries` the entries closest to expiry are evicted.
+    Every key expires, so redis' `volatile-lru` maxmemory policy (see docker-compose.yml) is a
+    second bound that never evicts the crawl frontier.
+    """
+
+    def __init__(self, client: Redis, namespace: str, max_entries: int = RESPONSE_CACHE_SIZE):
+        super().__init__()
+        self.client = client
+        self.prefix = f"cache:{namespace}:"
+        self.expiries_key = f"cache-expiries:{namespace}"
+        self.max_entries = max_entries
+
+    def _get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        if value is None or ttl <= 0:
+            return
+        now = time.time()
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(self.prefix + key, json.dumps(value, default=str), px=int(ttl * 1000))
+        pipeline.zadd(self.expiries_key, {key: now + ttl})
+        pipeline.zremrangebyscore(self.expiries_key, "-inf", now)
+        pipeline.zcard(self.expiries_key)
+        # the index lives as long as its longest lived entry
+        pipeline.expire(self.expiries_key, math.ceil(ttl) + 1, nx=True)
+        pipeline.expire(self.expiries_key, math.ceil(ttl) + 1, gt=True)
+        size = pipeline.execute()[3]
+        if size > self.max_entries:
+            evicted = [member for member, _ in self.client.zpopmin(self.expiries_key, size - self.max_entries)]
+            if evicted:
+                self.client.delete(*(self.prefix + member for member in evicted))
+
+    def delete(self, key: str):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.delete(self.prefix + key)
+        pipeline.zrem(self.expiries_key, key)
+        pipeline.execute()
+
+    def size(self) -> int:
+        """Entries not expired yet, ones evicted by redis early are counted until their TTL."""
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zremrangebyscore(self.expiries_key, "-inf", time.time())
+        pipeline.zcard(self.expiries_key)
+        return pipeline.execute()[1]
+
+
+def create_cache(namespace: str) -> ResponseCache:
+    """Redis backed cache when RESPONSE_CACHE_BACKEND=redis and REDIS_URL is configured, in-process otherwise."""
+    client = get_redis() if RESPONSE_CACHE_BACKEND == "redis" else None
+    if client is not None:
+        return RedisCache(client, namespace)
+    return MemoryCache()
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Set, Tuple
+
+# last event of a crawl, per-entity streams end with one of these. Crawl pool entities end on
+# buffered, their related_queued and completed only follow once the write-behind flush stores them
+TERMINAL_EVENTS = {"completed", "buffered", "not_found", "failed", "deferred"}
+
+
+class Subscription:
+    """Events matching a site (and optionally one identifier), delivered to a queue on the subscriber's event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, site: Optional[str], identifier: Optional[str], max_queued: int):
+        self.loop = loop
+        self.site = site
+        self.identifier = identifier
+        self.queue = asyncio.Queue(maxsize=max_queued)
+        self.dropped = 0
+
+    def matches(self, event: dict) -> bool:
+        return (self.site is None or event["site"] == self.site) and \
+            (self.identifier is None or event["identifier"] == self.identifier)
+
+    def _deliver(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1  # a slow client loses events rather than slowing the crawl down
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None if none arrives within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+    In-process pub/sub between the crawl threads and the event loop. Publishing never blocks,
+    and the latest event of recently crawled entities is kept so a client subscribing after
+    its crawl started (or finished) still learns where it stands.
+    """
+
+    def __init__(self, max_latest: int = 10000):
+        self.max_latest = max_latest
+        self._subscriptions: Set[Subscription] = set()
+        self._latest: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._lock = Lock()
+
+    def publish(self, site: str, identifier: str, type: str, **data) -> dict:
+        event = {"type": type, "site": site, "identifier": identifier, "at": time.time(), **data}
+        with self._lock:
+            self._latest[(site, identifier)] = event
+            self._latest.move_to_end((site, identifier))
+            while len(self._latest) > self.max_latest:
+                self._latest.popitem(last=False)
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.matches(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its event loop is closed
+        return event
+
+    def latest(self, site: str, identifier: str) -> Optional[dict]:
+        with self._lock:
+            return self._latest.get((site, identifier))
+
+    def subscribe(self, site: Optional[str] = None, identifier: Optional[str] = None, max_queued: int = 1000) -> Subscription:
+        """Subscribe from a coroutine, events are delivered on its running loop."""
+        subscription = Subscription(asyncio.get_running_loop(), site, identifier, max_queued)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
+
+
+# shared by every site worker of the process
+event_bus = EventBus()
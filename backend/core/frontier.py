@@ -0,0 +1,212 @@
+import heapq
+import itertools
+import os
+from abc import ABC, abstractmethod
+from threading import Condition
+from typing import List, Optional, Tuple
+
+from redis import Redis
+
+from core.redis_client import get_redis
+
+FRONTIER_MAX_SIZE = int(os.getenv("FRONTIER_MAX_SIZE", 100000))
+
+
+class Frontier(ABC):
+    """
+    Priority queue of entity identifiers waiting for a crawl stage.
+
+    With `dedupe` on, every identifier ever pushed is remembered in a seen-set so an
+    entity is only crawled once; `force=True` bypasses it for deliberate recrawls.
+    """
+
+    def __init__(self, dedupe: bool = True, max_size: int = FRONTIER_MAX_SIZE):
+        self.dedupe = dedupe
+        self.max_size = max_size
+
+    @abstractmethod
+    def push(self, identifier: str, priority: float = 0.0, force: bool = False) -> bool:
+        """Queue an identifier, returns False if it was already seen, is already queued or the frontier is full."""
+        pass
+
+    def push_many(self, identifiers: List[str], priority: float = 0.0, force: bool = False) -> List[bool]:
+        """push() for a batch of identifiers at one priority, returns whether each was queued."""
+        return [self.push(identifier, priority=priority, force=force) for identifier in identifiers]
+
+    @abstractmethod
+    def pop(self, timeout: float) -> Optional[Tuple[str, float]]:
+        """Block up to `timeout` seconds for the highest priority (identifier, priority)."""
+        pass
+
+    @abstractmethod
+    def mark_seen(self, identifier: str):
+        """Record an identifier crawled outside of the frontier (e.g. on a cache miss)."""
+        pass
+
+    @abstractmethod
+    def remove(self, identifier: str):
+        """Drop an identifier from the queue if it's there, it stays in the seen-set."""
+        pass
+
+    @abstractmethod
+    def contains(self, identifier: str) -> bool:
+        """Whether the identifier is currently queued."""
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+    @abstractmethod
+    def seen_count(self) -> int:
+        pass
+
+
+class MemoryFrontier(Frontier):
+    """In-process frontier, lost on restart. Used when REDIS_URL isn't set."""
+
+    def __init__(self, dedupe: bool = True, max_size: int = FRONTIER_MAX_SIZE):
+        super().__init__(dedupe, max_size)
+        self._heap = []
+        self._queued = {}  # identifier -> counter of its live heap entry, removed entries are skipped by pop
+        self._seen = set()
+        self._counter = itertools.count()  # keeps FIFO order between equal priorities
+        self._condition = Condition()
+
+    def push(self, identifier: str, priority: float = 0.0, force: bool = False) -> bool:
+        with self._condition:
+            if self.dedupe and identifier in self._seen and not force:
+                return False
+            if identifier in self._queued or len(self._queued) >= self.max_size:
+                return False
+            if self.dedupe:
+                self._seen.add(identifier)
+            counter = next(self._counter)
+            self._queued[identifier] = counter
+            heapq.heappush(self._heap, (-priority, counter, identifier))
+            self._condition.notify()
+            return True
+
+    def pop(self, timeout: float) -> Optional[Tuple[str, float]]:
+        with self._condition:
+            if not self._queued:
+                self._condition.wait(timeout)
+            while self._heap:
+                priority, counter, identifier = heapq.heappop(self._heap)
+                if self._queued.get(identifier) == counter:
+                    del self._queued[identifier]
+                    return identifier, -priority
+            return None
+
+    def mark_seen(self, identifier: str):
+        if self.dedupe:
+            with self._condition:
+                self._seen.add(identifier)
+
+    def remove(self, identifier: str):
+        with self._condition:
+            self._queued.pop(identifier, None)
+            # compact once removed entries outnumber live ones, queues that are rarely popped would keep them forever
+            if len(self._heap) > 2 * len(self._queued) + 64:
+                self._heap = [entry for entry in self._heap if self._queued.get(entry[2]) == entry[1]]
+                heapq.heapify(self._heap)
+
+    def contains(self, identifier: str) -> bool:
+        with self._condition:
+            return identifier in self._queued
+
+    def size(self) -> int:
+        with self._condition:
+            return len(self._queued)
+
+    def seen_count(self) -> int:
+        with self._condition:
+            return len(self._seen)
+
+
+class RedisFrontier(Frontier):
+    """
+    Durable frontier shared by every backend replica: a sorted set ordered by priority
+    plus a set of every identifier ever queued.
+    """
+
+    def __init__(self, client: Redis, site: str, stage: str, dedupe: bool = True, max_size: int = FRONTIER_MAX_SIZE):
+        super().__init__(dedupe, max_size)
+        self.client = client
+        self.queue_key = f"frontier:{site}:{stage}"
+        self.seen_key = f"frontier:{site}:seen"
+
+    def push(self, identifier: str, priority: float = 0.0, force: bool = False) -> bool:
+        if self.client.zcard(self.queue_key) >= self.max_size:
+            return False
+        if self.dedupe:
+            # SADD is the atomic claim, only the replica that added it queues it
+            added = self.client.sadd(self.seen_key, identifier)
+            if not added and not force:
+                return False
+        return bool(self.client.zadd(self.queue_key, {identifier: priority}, nx=True))
+
+    def push_many(self, identifiers: List[str], priority: float = 0.0, force: bool = False) -> List[bool]:
+        """
+        Same outcome as pushing them one by one, in two round trips whatever the batch size
+        instead of up to three per identifier.
+        """
+        if not identifiers:
+            return []
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.zcard(self.queue_key)
+        pipeline.zmscore(self.queue_key, identifiers)
+        if self.dedupe:
+            for identifier in identifiers:
+                pipeline.sadd(self.seen_key, identifier)
+        size, scores, *claims = pipeline.execute()
+        claims = claims or [True] * len(identifiers)
+        room = self.max_size - size
+        fits, unclaimed, batch = [], [], set()
+        for identifier, score, claimed in zip(identifiers, scores, claims):
+            # already queued, or earlier in this batch, push would turn it down too
+            eligible = (claimed or force) and score is None and identifier not in batch
+            batch.add(identifier)
+            fits.append(eligible and room > 0)
+            if fits[-1]:
+                room -= 1
+            elif eligible and self.dedupe and claimed:
+                unclaimed.append(identifier)  # like push, one that doesn't fit isn't marked seen
+        for identifier, fit in zip(identifiers, fits):
+            if fit:
+                pipeline.zadd(self.queue_key, {identifier: priority}, nx=True)
+        if unclaimed:
+            pipeline.srem(self.seen_key, *unclaimed)
+        added = iter(pipeline.execute())
+        return [fit and bool(next(added)) for fit in fits]
+
+    def pop(self, timeout: float) -> Optional[Tuple[str, float]]:
+        item = self.client.bzpopmax(self.queue_key, timeout=timeout)
+        if not item:
+            return None
+        _, identifier, priority = item
+        return identifier, priority
+
+    def mark_seen(self, identifier: str):
+        if self.dedupe:
+            self.client.sadd(self.seen_key, identifier)
+
+    def remove(self, identifier: str):
+        self.client.zrem(self.queue_key, identifier)
+
+    def contains(self, identifier: str) -> bool:
+        return self.client.zscore(self.queue_key, identifier) is not None
+
+    def size(self) -> int:
+        return self.client.zcard(self.queue_key)
+
+    def seen_count(self) -> int:
+        return self.client.scard(self.seen_key)
+
+
+def create_frontier(site: str, stage: str, dedupe: bool = True) -> Frontier:
+    """Redis backed frontier when REDIS_URL is configured, in-process otherwise."""
+    client = get_redis()
+    if client is not None:
+        return RedisFrontier(client, site, stage, dedupe=dedupe)
+    return MemoryFrontier(dedupe=dedupe)
@@ -0,0 +1,85 @@
+import heapq
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Optional, Tuple
+
+
+H_INDEX_CHUNK_SIZE = 65536
+
+
+def h_index(metrics: Iterable[int], chunk_size: int = H_INDEX_CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    (h-index, sum of metrics) of any iterable of metrics, consumed in a single pass in O(h + chunk_size) memory.
+
+    Only metrics above the current h can raise it, they are counted per value and h goes up
+    while more than h of them remain, dropping the ones it reaches. Metrics are taken a chunk
+    at a time so the filtering, counting and summing run at C speed.
+    """
+    metrics = iter(metrics)
+    h = above_h = total = 0
+    above = Counter()  # metric -> count, for metrics > h (at most h + chunk_size of them)
+    while True:
+        chunk = list(islice(metrics, chunk_size))
+        if not chunk:
+            return h, total
+        total += sum(chunk)
+        candidates = [metric for metric in chunk if metric > h]
+        above.update(candidates)
+        above_h += len(candidates)
+        while above_h > h:
+            # h + 1 metrics are > h, so h + 1 is reached and the metrics equal to it no longer count
+            h += 1
+            above_h -= above.pop(h, 0)
+
+
+def build_metric_state(rows: Iterable[Tuple[str, int, Optional[datetime]]], h: int, margin: int) -> dict:
+    """
+    Persisted per-entity state for incremental refreshes, from (key, metric, created_at) rows:
+    the newest created_at seen (the watermark) and the top h + margin items by metric.
+    Items outside the tracked set are below every tracked metric so they can't move the h-index
+    unless they overtake it, which the periodic full refresh catches.
+    """
+    watermark = None
+    top = []
+    for key, metric, created_at in rows:
+        if created_at is not None and (watermark is None or created_at > watermark):
+            watermark = created_at
+        if key is None:
+            continue
+        if len(top) < h + margin:
+            heapq.heappush(top, (metric, key))
+        elif metric > top[0][0]:
+            heapq.heapreplace(top, (metric, key))
+    return {
+        "watermark": watermark.isoformat() if watermark else None,
+        "tracked": {key: metric for metric, key in top},
+        "full_refresh_at": datetime.now().isoformat(),
+    }
+
+
+def apply_metric_updates(state: dict, total: int, new_rows: Iterable[Tuple[str, int, Optional[datetime]]],
+                         rechecked: Dict[str, int], margin: int) -> Tuple[int, int, dict]:
+    """
+    Fold an incremental refresh into the persisted state: items newer than the watermark
+    plus the current metrics of the tracked items. Returns (h-index, total, new state).
+    """
+    tracked = dict(state.get("tracked", {}))
+    for key, metric in rechecked.items():
+        if key in tracked:
+            total += metric - tracked[key]
+            tracked[key] = metric
+
+    watermark = datetime.fromisoformat(state["watermark"]) if state.get("watermark") else None
+    for key, metric, created_at in new_rows:
+        total += metric
+        if key is not None and key not in tracked:
+            tracked[key] = metric
+        if created_at is not None and (watermark is None or created_at > watermark):
+            watermark = created_at
+
+    h, _ = h_index(tracked.values())
+    new_state = build_metric_state(((key, metric, None) for key, metric in tracked.items()), h, margin)
+    new_state["watermark"] = watermark.isoformat() if watermark else None
+    new_state["full_refresh_at"] = state.get("full_refresh_at")
+    return h, total, new_state
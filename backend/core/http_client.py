@@ -0,0 +1,105 @@
+import os
+from threading import Lock
+from typing import Dict, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core import metrics
+from core.cache import ResponseCache, request_key
+from core.quota import QuotaExceeded, QuotaManager
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", 10))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+
+
+class HttpClient:
+    """
+    Pooled keep-alive session shared by a site worker's threads, with timeouts, retries
+    with exponential backoff on transient errors, and rate limit tracking from the
+    X-RateLimit-* response headers so no extra calls are spent probing the quota.
+    With a `quota`, every call reserves its budget first (waiting at most `quota_timeout`
+    seconds) and the headers keep the quota in line with what the API reports.
+    With a `cache`, get_json serves call types that have a TTL in `cache_ttls` from it.
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, timeout: float = HTTP_TIMEOUT_SECONDS,
+                 retries: int = HTTP_RETRIES, backoff_factor: float = 0.5, pool_size: int = HTTP_POOL_SIZE,
+                 quota: Optional[QuotaManager] = None, quota_timeout: Optional[float] = None,
+                 cache: Optional[ResponseCache] = None, cache_ttls: Optional[Dict[str, float]] = None,
+                 site: Optional[str] = None):
+        self.timeout = timeout
+        self.site = site or "unknown"  # metrics label
+        self.quota = quota
+        self.quota_timeout = quota_timeout
+        self.cache = cache
+        self.cache_ttls = cache_ttls or {}
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._rate_limit_lock = Lock()
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset: Optional[float] = None  # epoch seconds
+
+    def _track_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return
+        with self._rate_limit_lock:
+            self.rate_limit_remaining = int(remaining)
+            self.rate_limit_reset = float(reset) if reset is not None else None
+        if self.quota:
+            self.quota.sync(self.rate_limit_remaining, self.rate_limit_reset)
+
+    def get(self, url: str, call_type: Optional[str] = None, **kwargs) -> requests.Response:
+        if self.quota and not self.quota.reserve(call_type, timeout=self.quota_timeout):
+            raise QuotaExceeded(f"No quota left for {call_type or url}")
+        kwargs.setdefault("timeout", self.timeout)
+        metrics.UPSTREAM_CALLS.labels(self.site, call_type or "default").inc()
+        response = self.session.get(url, **kwargs)
+        self._track_rate_limit(response)
+        return response
+
+    def get_json(self, url: str, call_type: Optional[str] = None, **kwargs):
+        ttl = self.cache_ttls.get(call_type, 0)
+        if self.cache is not None and ttl > 0:
+            key = request_key(call_type, url, kwargs.get("params"))
+            return self.cache.get_or_fetch(key, lambda: self._fetch_json(url, call_type, **kwargs), ttl)
+        return self._fetch_json(url, call_type, **kwargs)
+
+    def _fetch_json(self, url: str, call_type: Optional[str] = None, **kwargs):
+        response = self.get(url, call_type=call_type, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get_paginated(self, url: str, params: Optional[dict] = None, call_type: Optional[str] = None, **kwargs) -> Iterator:
+        """Yield the items of every page of a JSON list endpoint, following `Link: rel="next"` headers."""
+        while url:
+            response = self.get(url, call_type=call_type, params=params, **kwargs)
+            response.raise_for_status()
+            yield from response.json()
+            url = response.links.get("next", {}).get("url")
+            params = None  # the next link already carries the query string
+
+    @staticmethod
+    def last_page(response: requests.Response, page_param: str = "page") -> int:
+        """Number of the last page of a paginated endpoint, from its `Link: rel="last"` header (1 without one)."""
+        last_url = response.links.get("last", {}).get("url")
+        if not last_url:
+            return 1
+        return int(parse_qs(urlparse(last_url).query).get(page_param, ["1"])[0])
@@ -0,0 +1,142 @@
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+from redis import Redis
+
+from core.redis_client import get_redis
+
+UNWRITTEN_LEASE_SECONDS = int(os.getenv("UNWRITTEN_LEASE_SECONDS", 60))
+
+
+def replica_id() -> str:
+    """Identifies this process among the replicas sharing redis."""
+    return os.getenv("REPLICA_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WriteJournal(ABC):
+    """
+    Entities crawled by this replica whose rows are still in its write buffer, so the ones a
+    crashed replica never flushed can be crawled again.
+    """
+
+    @abstractmethod
+    def record(self, identifier: str, index: int):
+        pass
+
+    @abstractmethod
+    def remove(self, identifiers: Iterable[str]):
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+    @abstractmethod
+    def heartbeat(self):
+        """Tell the other replicas this one is alive and still owns its entries."""
+        pass
+
+    @abstractmethod
+    def recover(self) -> List[Tuple[str, int]]:
+        """Take the (identifier, index) entries of replicas that stopped heartbeating, each is recovered by one replica only."""
+        pass
+
+
+class MemoryJournal(WriteJournal):
+    """Journal of a single process, it dies with its buffer so there is never anything to recover."""
+
+    def __init__(self):
+        self._entries: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def record(self, identifier: str, index: int):
+        with self._lock:
+            self._entries[identifier] = index
+
+    def remove(self, identifiers: Iterable[str]):
+        with self._lock:
+            for identifier in identifiers:
+                self._entries.pop(identifier, None)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def heartbeat(self):
+        pass
+
+    def recover(self) -> List[Tuple[str, int]]:
+        return []
+
+
+class RedisJournal(WriteJournal):
+    """
+    A sorted set per replica, identifier -> index, next to a lease key the replica refreshes
+    while it runs. Once the lease expires another replica claims it (SET NX) and drains the journal.
+    """
+
+    def __init__(self, client: Redis, site: str, replica: str, lease_seconds: int = UNWRITTEN_LEASE_SECONDS):
+        self.client = client
+        self.site = site
+        self.replica = replica
+        self.lease_seconds = lease_seconds
+        self.replicas_key = f"unwritten:{site}:replicas"
+        self.key = self._journal_key(replica)
+        self._heartbeat_at = 0.0
+
+    def _journal_key(self, replica: str) -> str:
+        return f"unwritten:{self.site}:{replica}"
+
+    def _lease_key(self, replica: str) -> str:
+        return f"unwritten:{self.site}:{replica}:lease"
+
+    def record(self, identifier: str, index: int):
+        self.client.zadd(self.key, {identifier: index})
+        self.heartbeat()
+
+    def remove(self, identifiers: Iterable[str]):
+        identifiers = list(identifiers)
+        if identifiers:
+            self.client.zrem(self.key, *identifiers)
+
+    def size(self) -> int:
+        return self.client.zcard(self.key)
+
+    def heartbeat(self):
+        # a third of the lease between refreshes, record() calls this on every crawl
+        if time.monotonic() - self._heartbeat_at < self.lease_seconds / 3:
+            return
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.sadd(self.replicas_key, self.replica)
+        pipeline.set(self._lease_key(self.replica), self.replica, ex=self.lease_seconds)
+        pipeline.execute()
+        self._heartbeat_at = time.monotonic()
+
+    def recover(self) -> List[Tuple[str, int]]:
+        recovered = []
+        for replica in self.client.smembers(self.replicas_key):
+            if replica == self.replica:
+                continue
+            # only an expired lease can be claimed, and by one replica
+            if not self.client.set(self._lease_key(replica), self.replica, nx=True, ex=self.lease_seconds):
+                continue
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.zrange(self._journal_key(replica), 0, -1, withscores=True)
+            pipeline.delete(self._journal_key(replica))
+            pipeline.srem(self.replicas_key, replica)
+            pipeline.delete(self._lease_key(replica))
+            entries = pipeline.execute()[0]
+            recovered.extend((identifier, int(index)) for identifier, index in entries)
+        return recovered
+
+
+def create_journal(site: str) -> WriteJournal:
+    """Redis backed, per replica journal when REDIS_URL is configured, in-process otherwise."""
+    client = get_redis()
+    if client is not None:
+        return RedisJournal(client, site, replica_id())
+    return MemoryJournal()
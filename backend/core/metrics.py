@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# site worker calls: entity_info, entity_updates, get_related_entities, calculate_h_index, write_entities
+SITE_CALL_SECONDS = Histogram(
+    "site_call_seconds", "Duration of site worker calls", ["site", "call"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+SITE_CALL_ERRORS = Counter("site_call_errors_total", "Site worker calls that raised", ["site", "call"])
+UPSTREAM_CALLS = Counter("upstream_calls_total", "Calls made to site APIs", ["site", "call_type"])
+ENTITIES_CRAWLED = Counter("entities_crawled_total", "Finished crawls by outcome", ["site", "outcome"])
+WRITE_BATCH_ROWS = Histogram(
+    "write_batch_rows", "Rows per entity upsert", ["site"],
+    buckets=(1, 5, 10, 50, 100, 250, 500, 1000),
+)
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "API request latency", ["method", "route", "status"])
+
+# sampled when scraped, see SiteWorker.register_gauges
+QUEUE_DEPTH = Gauge("crawl_queue_depth", "Entities waiting in a crawl stage", ["site", "stage"])
+SEEN_ENTITIES = Gauge("crawl_seen_entities", "Entities queued or crawled at least once", ["site"])
+WORKERS_ALIVE = Gauge("crawl_workers_alive", "Live crawl pool threads", ["site"])
+HEARTBEAT_AGE = Gauge("crawl_heartbeat_age_seconds", "Seconds since a crawl thread last went round its loop", ["site"])
+WRITE_BUFFER_ROWS = Gauge("crawl_write_buffer_rows", "Rows waiting for the next batch write", ["site"])
+QUOTA_AVAILABLE = Gauge("quota_available_units", "API budget left", ["site"])
+
+
+@contextmanager
+def timed(site: str, call: str):
+    """Observe the duration of the block under `call`, counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SITE_CALL_ERRORS.labels(site, call).inc()
+        raise
+    finally:
+        SITE_CALL_SECONDS.labels(site, call).observe(time.perf_counter() - start)
+
+
+def gauge_function(gauge: Gauge, fn: Callable[[], float], **labels):
+    """Sample `fn` whenever metrics are scraped instead of updating the gauge on the hot path."""
+    def sample():
+        try:
+            return fn()
+        except Exception:
+            return float("nan")  # e.g. redis unreachable, don't fail the whole scrape
+    gauge.labels(**labels).set_function(sample)
+
+
+def render():
+    """Prometheus text exposition of every metric, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
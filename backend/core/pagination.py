@@ -0,0 +1,27 @@
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_bounded(executor: Executor, fn: Callable[[T], R], items: Iterable[T], max_in_flight: int) -> Iterator[R]:
+    """
+    Like executor.map, but `items` is consumed lazily with at most `max_in_flight` calls
+    running at once, so items produced by a paginated walk are submitted as they arrive
+    instead of after the last page. Results are yielded in order; on error or early exit
+    the calls that haven't started yet are cancelled.
+    """
+    in_flight = deque()
+    items = iter(items)
+    try:
+        for item in items:
+            in_flight.append(executor.submit(fn, item))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        for future in in_flight:
+            future.cancel()
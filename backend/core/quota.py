@@ -0,0 +1,181 @@
+import time
+from threading import Condition
+from typing import Any, Callable, Dict, Optional
+
+from redis import Redis
+
+from core.redis_client import get_redis
+
+
+class QuotaExceeded(Exception):
+    """No API budget left within the time the caller was willing to wait."""
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled continuously at `refill_per_second`."""
+
+    def __init__(self, capacity: float, refill_per_second: float, tokens: Optional[float] = None,
+                 updated_at: Optional[float] = None, paused_until: float = 0.0):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity if tokens is None else tokens
+        self._updated_at = time.monotonic() if updated_at is None else updated_at
+        self._paused_until = paused_until
+
+    def refill(self, now: float):
+        if now < self._paused_until:
+            self._updated_at = now
+            return
+        if self._paused_until:
+            # the upstream window reset, the whole quota is back
+            self._paused_until = 0.0
+            self.tokens = self.capacity
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens are available."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.tokens >= cost:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return (min(cost, self.capacity) - self.tokens) / self.refill_per_second
+
+    def pause_until(self, until: float):
+        """No tokens until `until` (on the clock `now` is given in), then a full bucket. Used when the upstream says the quota is gone."""
+        self.tokens = 0
+        self._paused_until = until
+
+
+class QuotaManager:
+    """
+    Per-site API budget. Every call type has a cost (e.g. YouTube's search.list is 100 units,
+    channels.list 1) and callers reserve budget before making the call. Without a capacity
+    the site is treated as unlimited and reservations always succeed immediately.
+
+    With a redis `client` the bucket lives in a hash under `key` and is shared by every
+    replica, and survives restarts, so deploys don't hand out a fresh daily quota. Its times
+    are epoch seconds there, monotonic ones in process.
+    """
+
+    def __init__(self, capacity: Optional[float] = None, refill_per_second: float = 0.0,
+                 costs: Optional[Dict[str, float]] = None, default_cost: float = 1.0,
+                 client: Optional[Redis] = None, key: Optional[str] = None):
+        self.bucket = TokenBucket(capacity, refill_per_second) if capacity else None
+        self.costs = costs or {}
+        self.default_cost = default_cost
+        self.client = client
+        self.key = key
+        self._condition = Condition()
+
+    @property
+    def limited(self) -> bool:
+        return self.bucket is not None
+
+    def cost(self, call_type: Optional[str]) -> float:
+        return self.costs.get(call_type, self.default_cost)
+
+    def _apply(self, fn: Callable[[TokenBucket, float], Any]) -> Any:
+        """
+        Run `fn(bucket, now)` on the refilled bucket, holding self._condition. Redis buckets
+        are loaded and written back in a WATCH/MULTI transaction, retried if another replica
+        changed it in between.
+        """
+        if self.client is None:
+            now = time.monotonic()
+            self.bucket.refill(now)
+            return fn(self.bucket, now)
+
+        def transaction(pipe):
+            now = time.time()
+            state = pipe.hgetall(self.key)
+            bucket = TokenBucket(
+                self.bucket.capacity, self.bucket.refill_per_second,
+                tokens=float(state["tokens"]) if state else None,
+                updated_at=float(state["updated_at"]) if state else now,
+                paused_until=float(state.get("paused_until", 0)),
+            )
+            bucket.refill(now)
+            result = fn(bucket, now)
+            pipe.multi()
+            # no TTL: a volatile-lru maxmemory policy would evict it, and a missing bucket is a full one
+            pipe.hset(self.key, mapping={"tokens": bucket.tokens, "updated_at": bucket._updated_at, "paused_until": bucket._paused_until})
+            return result
+        return self.client.transaction(transaction, self.key, value_from_callable=True)
+
+    def available(self) -> float:
+        if not self.limited:
+            return float("inf")
+        with self._condition:
+            return self._apply(lambda bucket, now: bucket.tokens)
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` units could be reserved, 0 if they can be right now."""
+        if not self.limited:
+            return 0.0
+        with self._condition:
+            return self._apply(lambda bucket, now: bucket.wait_time(cost, now))
+
+    @staticmethod
+    def _take(cost: float):
+        """Take `cost` tokens if the bucket has them, returns the seconds to wait otherwise (0 when taken)."""
+        def take(bucket: TokenBucket, now: float) -> float:
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                return 0.0
+            return max(bucket.wait_time(cost, now), 1e-3)
+        return take
+
+    def try_reserve(self, call_type: Optional[str] = None, cost: Optional[float] = None) -> bool:
+        if not self.limited:
+            return True
+        cost = self.cost(call_type) if cost is None else cost
+        with self._condition:
+            return self._apply(self._take(cost)) == 0
+
+    def reserve(self, call_type: Optional[str] = None, timeout: Optional[float] = None,
+                should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Block until the call's cost is reserved. Returns False if `timeout` passes or
+        `should_stop` turns true first, so crawl threads can still shut down promptly.
+        """
+        if not self.limited:
+            return True
+        cost = self.cost(call_type)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                wait = self._apply(self._take(cost))
+                if wait == 0:
+                    return True
+                if should_stop and should_stop():
+                    return False
+                if deadline is not None:
+                    now = time.monotonic()
+                    if now >= deadline:
+                        return False
+                    wait = min(wait, deadline - now)
+                # wake up regularly to honour should_stop and upstream syncs (other replicas' included)
+                self._condition.wait(min(wait, 1.0))
+
+    def sync(self, remaining: int, reset_at: Optional[float] = None):
+        """Align the bucket with the quota the upstream API reports (reset_at is epoch seconds)."""
+        if not self.limited:
+            return
+
+        def align(bucket: TokenBucket, now: float):
+            bucket.tokens = min(bucket.capacity, float(remaining))
+            if remaining <= 0 and reset_at is not None:
+                bucket.pause_until(now + max(reset_at - time.time(), 0) + 1)  # 1 second buffer
+        with self._condition:
+            self._apply(align)
+            self._condition.notify_all()
+
+
+def create_quota(site: str, capacity: Optional[float] = None, refill_per_second: float = 0.0,
+                 costs: Optional[Dict[str, float]] = None) -> QuotaManager:
+    """Quota shared through redis (between replicas and across restarts) when REDIS_URL is configured, in-process otherwise."""
+    client = get_redis() if capacity else None
+    return QuotaManager(capacity, refill_per_second, costs, client=client, key=f"quota:{site}" if client else None)
@@ -0,0 +1,106 @@
+from threading import Lock
+from typing import Iterable, List, Optional, Tuple
+
+
+class RankIndex:
+    """
+    In-process frequency index of h-index values backed by a Fenwick tree.
+
+    Answers "how many entities have index > x" and "which index sits at rank r" in O(log n)
+    of the largest index value, independent of the number of entities. Index values are
+    small non-negative integers so the tree stays small; it grows by doubling when needed.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._lock = Lock()
+        self._reset(capacity)
+        self.loaded = False
+
+    def _reset(self, capacity: int):
+        self._capacity = capacity
+        self._counts = [0] * capacity
+        self._tree = [0] * (capacity + 1)
+        self._total = 0
+
+    def _tree_add(self, value: int, delta: int):
+        i = value + 1
+        while i <= self._capacity:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, value: int) -> int:
+        """Number of entities with index <= value."""
+        if value < 0:
+            return 0
+        i = min(value + 1, self._capacity)
+        result = 0
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def _grow(self, value: int):
+        capacity = self._capacity
+        while value >= capacity:
+            capacity *= 2
+        counts = self._counts
+        self._reset(capacity)
+        for i, count in enumerate(counts):
+            if count:
+                self._add(i, count)
+
+    def _add(self, value: int, delta: int):
+        value = max(int(value), 0)
+        if value >= self._capacity:
+            self._grow(value)
+        self._counts[value] += delta
+        self._total += delta
+        self._tree_add(value, delta)
+
+    def load(self, index_counts: Iterable[Tuple[int, int]]):
+        """Rebuild from (index, count) pairs, e.g. SiteWorker.get_index_counts."""
+        with self._lock:
+            self._reset(self._capacity)
+            for value, count in index_counts:
+                self._add(value, count)
+            self.loaded = True
+
+    def update(self, previous: Optional[int], current: Optional[int]):
+        """Move one entity from `previous` to `current`; None means the entity didn't exist / was removed."""
+        with self._lock:
+            if previous is not None:
+                self._add(previous, -1)
+            if current is not None:
+                self._add(current, 1)
+
+    def index_counts(self) -> List[Tuple[int, int]]:
+        """(index, count) pairs of the index values held, what summarize_index_counts takes."""
+        with self._lock:
+            return [(value, count) for value, count in enumerate(self._counts) if count]
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return self._total
+
+    def count_greater(self, value: int) -> int:
+        with self._lock:
+            return self._total - self._prefix(value)
+
+    def value_at_rank(self, rank: int) -> Optional[int]:
+        """
+        Index value of the entity at 0-based position `rank` in descending index order,
+        or None if rank is out of range.
+        """
+        with self._lock:
+            if rank < 0 or rank >= self._total:
+                return None
+            remaining = self._total - 1 - rank  # position in ascending order
+            position = 0
+            step = 1 << self._capacity.bit_length()
+            while step:
+                if position + step <= self._capacity and self._tree[position + step] <= remaining:
+                    position += step
+                    remaining -= self._tree[position]
+                step >>= 1
+            return position
@@ -0,0 +1,23 @@
+import os
+from threading import Lock
+from typing import Optional
+
+from redis import Redis
+
+_client = None
+_client_lock = Lock()
+
+
+def get_redis() -> Optional[Redis]:
+    """
+    Shared redis client built from REDIS_URL, or None when redis isn't configured
+    in which case callers fall back to their in-process implementation.
+    """
+    global _client
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = Redis.from_url(url, decode_responses=True)
+        return _client
@@ -0,0 +1,67 @@
+from concurrent.futures import Executor, Future
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is in flight, further calls for the same
+    key wait for its result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = Lock()
+
+    def _claim(self, key: Hashable) -> Tuple[Future, bool]:
+        """The in-flight future for `key` and whether the caller is the one who has to run it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _execute(self, key: Hashable, future: Future, fn: Callable, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            self._release(key)
+            return
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._release(key)
+            future.set_exception(e)
+        else:
+            self._release(key)
+            future.set_result(result)
+
+    def _release(self, key: Hashable):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn in the calling thread, or wait for the call already in flight for `key`."""
+        future, leader = self._claim(key)
+        if leader:
+            self._execute(key, future, fn, args, kwargs)
+        return future.result()
+
+    def submit(self, executor: Executor, key: Hashable, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Run fn on `executor`, or share the call already in flight for `key`. Waiting doesn't hold
+        a thread, so on an event loop wrap the future with asyncio.wrap_future (inside asyncio.shield,
+        as a cancelled waiter would otherwise cancel the shared future).
+        """
+        future, leader = self._claim(key)
+        if leader:
+            try:
+                executor.submit(self._execute, key, future, fn, args, kwargs)
+            except BaseException as e:
+                self._release(key)
+                future.set_exception(e)
+        return future
@@ -0,0 +1,68 @@
+import math
+from typing import Iterable, List, Tuple
+
+
+def _value_at(counts: List[Tuple[int, int]], position: int) -> int:
+    """Return the value at a 0-based position of the sorted population described by (value, count) pairs."""
+    seen = 0
+    for value, count in counts:
+        seen += count
+        if position < seen:
+            return value
+    return counts[-1][0]
+
+
+def percentile_cont(counts: List[Tuple[int, int]], total: int, fraction: float) -> float:
+    """Same interpolation as postgres percentile_cont, computed from a sorted frequency table."""
+    position = fraction * (total - 1)
+    lower = _value_at(counts, math.floor(position))
+    upper = _value_at(counts, math.ceil(position))
+    return lower + (position - math.floor(position)) * (upper - lower)
+
+
+def summarize_index_counts(index_counts: Iterable[Tuple[int, int]], buckets: int = 10):
+    """
+    Build the summary statistics and histogram for a site from (index, count) pairs,
+    i.e. the result of a single `SELECT index, count(*) ... GROUP BY index` scan.
+
+    Returns None when there are no entities.
+    """
+    counts = sorted((int(value), int(count)) for value, count in index_counts if count)
+    total = sum(count for _, count in counts)
+    if total == 0:
+        return None
+
+    min_index = counts[0][0]
+    max_index = counts[-1][0]
+    mean = sum(value * count for value, count in counts) / total
+    # sample standard deviation, matching postgres stddev()
+    variance = sum(count * (value - mean) ** 2 for value, count in counts) / (total - 1) if total > 1 else 0.0
+
+    bucket_size = (max_index - min_index) / buckets if max_index > min_index else 1
+    histogram_counts = [0] * buckets
+    for value, count in counts:
+        bucket = int((value - min_index) / bucket_size)
+        histogram_counts[min(bucket, buckets - 1)] += count  # max value lands in the last bucket
+
+    histogram = []
+    for i, count in enumerate(histogram_counts):
+        bucket_start = min_index + (i * bucket_size)
+        bucket_end = min_index + ((i + 1) * bucket_size)
+        histogram.append({
+            "bucket_start": round(bucket_start, 2),
+            "bucket_end": round(bucket_end, 2),
+            "count": count,
+            "percentage": round(count * 100 / total, 2)
+        })
+
+    return {
+        "current_entities": total,
+        "index_min": min_index,
+        "index_max": max_index,
+        "index_mean": mean,
+        "index_median": percentile_cont(counts, total, 0.5),
+        "index_stddev": math.sqrt(variance),
+        "1q": percentile_cont(counts, total, 0.25),
+        "3q": percentile_cont(counts, total, 0.75),
+        "histogram": histogram
+    }
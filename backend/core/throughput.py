@@ -0,0 +1,31 @@
+import time
+from collections import deque
+from threading import Lock
+
+
+class ThroughputMeter:
+    """Counts events and reports their rate over a sliding time window."""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self._events = deque()
+        self._lock = Lock()
+        self.total = 0
+
+    def _trim(self, now: float):
+        while self._events and self._events[0] <= now - self.window_seconds:
+            self._events.popleft()
+
+    def mark(self):
+        now = time.monotonic()
+        with self._lock:
+            self._events.append(now)
+            self.total += 1
+            self._trim(now)
+
+    def rate(self) -> float:
+        """Events per second over the window."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return len(self._events) / self.window_seconds
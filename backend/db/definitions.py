@@ -1,11 +1,12 @@
-from sqlalchemy import create_engine, text, Column, String, DateTime, UUID, ForeignKey, Integer, Float, Boolean, Enum
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import create_engine, text, Column, String, DateTime, UUID, ForeignKey, Integer, Float, Boolean, Enum, JSON
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.pool import QueuePool
 
 import os 
 from datetime import datetime 
 import uuid 
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import declared_attr, deferred
 
 Base = declarative_base()
 
@@ -22,6 +23,17 @@ engine = create_engine(
     pool_pre_ping=True  # Verify connection is still valid before using
 )
 
+# Used by the FastAPI request path so database reads don't block the event loop,
+# the sync engine above stays with the crawl threads
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{os.getenv('DB_URL')}"
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=20,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True
+)
+
 
 class ToDictMixin:
     def to_dict(self,drop=[]):
@@ -50,6 +62,14 @@ class EntityBase(Base,ToDictMixin):
     total_metrics = Column(Integer, default=0)
     url = Column(String, nullable=True)
 
+    @declared_attr
+    def metric_state(cls):
+        # watermark and tracked top metrics for incremental refreshes, only loaded by the crawler
+        return deferred(Column(JSON, nullable=True))
+
+    def to_dict(self, drop=[]):
+        return super().to_dict(drop=list(drop) + ['metric_state'])
+
 
 class AggregatedMetrics(Base,ToDictMixin):
     __tablename__ = "sites"
@@ -64,8 +84,24 @@ class AggregatedMetrics(Base,ToDictMixin):
     last_updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     created_at = Column(DateTime, default=datetime.now)
     total_entities = Column(Integer,default=0)
+    # precomputed snapshot served by /supported-sites, see SiteWorker.refresh_metadata
+    index_1q = Column(Float,default=0)
+    index_3q = Column(Float,default=0)
+    histogram = Column(JSON,default=list)
 
-def create_tables():
-    Base.metadata.create_all(engine) 
+# create_all doesn't add columns to tables that already exist
+MIGRATIONS = [
+    # trigram indexes on site identifiers, see SiteWorker.search_entities
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE meta.sites ADD COLUMN IF NOT EXISTS index_1q DOUBLE PRECISION DEFAULT 0",
+    "ALTER TABLE meta.sites ADD COLUMN IF NOT EXISTS index_3q DOUBLE PRECISION DEFAULT 0",
+    "ALTER TABLE meta.sites ADD COLUMN IF NOT EXISTS histogram JSON",
+]
 
-create_tables()
\ No newline at end of file
+def create_tables():
+    """Create the shared tables and apply MIGRATIONS, run once per deploy by db.migrate rather than on import."""
+    # site tables are created by SiteWorker.ensure_schema, once pg_trgm exists for their indexes
+    Base.metadata.create_all(engine, tables=[table for table in Base.metadata.sorted_tables if table.schema != "sites"])
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            connection.execute(text(migration))
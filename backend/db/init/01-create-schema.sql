@@ -1 +1 @@
-CREATE SCHEMA IF NOT EXISTS sites;CREATE SCHEMA IF NOT EXISTS meta; 
\ No newline at end of file
+CREATE SCHEMA IF NOT EXISTS sites;CREATE SCHEMA IF NOT EXISTS meta;CREATE EXTENSION IF NOT EXISTS pg_trgm;
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+One-time schema setup: the shared tables and MIGRATIONS, then every site table. Run it once
+per deploy, before the API starts (see backend.Dockerfile), so starting a worker never touches
+the schema and doesn't need the database at all.
+
+    python -m db.migrate
+"""
+from typing import Iterable
+
+from dotenv import load_dotenv
+
+from db.definitions import create_tables
+
+
+def migrate(site_workers: Iterable = ()):
+    """Create or update the shared tables, then the table of each of `site_workers`."""
+    create_tables()
+    for site_worker in site_workers:
+        site_worker.ensure_schema()
+        print(f"Migrated sites.{site_worker.name}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    from utils import load_site_workers
+
+    migrate(load_site_workers().values())
@@ -1,14 +1,23 @@
 from dotenv import load_dotenv
 import os
+import asyncio
+import base64
+import json
 import importlib
-from typing import Dict, Type
+import time
+from typing import Dict, List, Type, Optional
 
 from sites import SiteWorker
+from core.cache import MemoryCache
+from core.singleflight import SingleFlight
+from core.events import event_bus, TERMINAL_EVENTS
+from core import metrics
 from sites.types import RequestEntity, SupportedSites
 
 from fastapi import FastAPI, Request, Body, Path
 from contextlib import asynccontextmanager
-from fastapi.responses import JSONResponse
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -16,19 +25,87 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from redis import Redis
 from rq import Queue
-from queue import Queue as InMemoryQueue
 
 from utils import load_site_workers
 
 state = {}
 
+METADATA_REFRESH_INTERVAL = float(os.getenv("METADATA_REFRESH_INTERVAL", 5))
+# upstream fetches on the request path run here so a slow site can't stall the event loop
+REQUEST_EXECUTOR_WORKERS = int(os.getenv("REQUEST_EXECUTOR_WORKERS", 8))
+
+async def refresh_site_metadata():
+    """
+    Keep each site's statistics snapshot fresh so /supported-sites never scans the site tables.
+    A site is refreshed once it has pending writes (rate limited) or its snapshot exceeds the staleness bound.
+    """
+    while True:
+        for site_worker in state['site_workers'].values():
+            try:
+                if site_worker.metadata_needs_refresh():
+                    await asyncio.to_thread(site_worker.refresh_metadata)
+            except Exception as e:
+                print(f"Error refreshing metadata for {site_worker.name}: {e}")
+        await asyncio.sleep(METADATA_REFRESH_INTERVAL)
+
+RECRAWL_INTERVAL = float(os.getenv("RECRAWL_INTERVAL", 300))
+# /{site}/{identifier} responses of popular profiles, dropped whenever the entity is written.
+# The TTL bounds how far the percentile can drift as the rest of the site changes.
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", 10000))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", 60))
+
+# cold lookups of the same entity share one crawl, however many requests are waiting for it
+entity_lookups = SingleFlight()
+# entities asked for by users are crawled ahead of the ones the crawl discovers (prioritised by h-index)
+USER_REQUEST_PRIORITY = 1_000_000
+# /entities/batch: max pairs per request, and how many misses all batches together crawl at once
+# so imports can't take the whole request executor from single lookups
+BATCH_MAX_ENTITIES = int(os.getenv("BATCH_MAX_ENTITIES", 10000))
+BATCH_CRAWL_CONCURRENCY = int(os.getenv("BATCH_CRAWL_CONCURRENCY", 4))
+# comment lines sent on idle event streams so proxies don't close them
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+
+def entity_cache_key(site: str, identifier: str) -> str:
+    return f"{site}:{identifier}"
+
+def invalidate_entities(site: str, identifiers):
+    for identifier in identifiers:
+        state['entity_cache'].delete(entity_cache_key(site, identifier))
+
+async def recrawl_stale_entities():
+    """Feed the stalest, highest index entities of every site back into the crawl pool, within each site's budget."""
+    while True:
+        await asyncio.sleep(RECRAWL_INTERVAL)
+        for site_worker in state['site_workers'].values():
+            budget = int(site_worker.recrawl_budget_per_hour * RECRAWL_INTERVAL / 3600)
+            try:
+                await asyncio.to_thread(site_worker.schedule_recrawl, budget)
+            except Exception as e:
+                print(f"Error scheduling recrawl for {site_worker.name}: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     load_dotenv()
     state['site_workers'] = load_site_workers()
-    state['priority_queue'] = InMemoryQueue() # TODO: replace with redis implementation
-    state['cache'] = {}
+    # /supported-sites starts from the stored snapshots, the refresher takes over from there
+    for site_worker, result in zip(state['site_workers'].values(), await asyncio.gather(
+        *(asyncio.to_thread(site_worker.load_metadata) for site_worker in state['site_workers'].values()),
+        return_exceptions=True,
+    )):
+        if isinstance(result, Exception):
+            print(f"Error loading metadata for {site_worker.name}: {result}")
+    state['entity_cache'] = MemoryCache(max_entries=ENTITY_CACHE_SIZE)
+    for site_worker in state['site_workers'].values():
+        site_worker.add_write_listener(invalidate_entities)
+        site_worker.start_queue_monitor()
+    state['executor'] = ThreadPoolExecutor(max_workers=REQUEST_EXECUTOR_WORKERS, thread_name_prefix="request")
+    state['batch_crawl_slots'] = asyncio.Semaphore(BATCH_CRAWL_CONCURRENCY)
+    metadata_refresher = asyncio.create_task(refresh_site_metadata())
+    recrawl_scheduler = asyncio.create_task(recrawl_stale_entities())
     yield
+    metadata_refresher.cancel()
+    recrawl_scheduler.cancel()
+    state['executor'].shutdown(wait=False, cancel_futures=True)
     for site_worker in state['site_workers'].values():
         site_worker.stop_queue_monitor()
 
@@ -46,6 +123,25 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    """Latency per route template (not per path, which would make a series per identifier)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", str(status))\
+            .observe(time.perf_counter() - start)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def hello_world():
     return JSONResponse(content={"response": "Hello World"}, status_code=200)
@@ -56,27 +152,173 @@ async def add_entity(entity: RequestEntity):
     if entity.type not in state['site_workers']:
         return JSONResponse(content={"error": "Site not supported"}, status_code=400)
     site_worker = state['site_workers'][entity.type]
-    related_entities = site_worker.get_related_entities(entity)
-    entity_info = site_worker.entity_info(entity)
+    # the crawl pool fetches, stores and expands it, redis round trips stay off the event loop
+    if not (await asyncio.to_thread(site_worker.queue_entities, [entity], priority=USER_REQUEST_PRIORITY))[0]:
+        return JSONResponse(content={"response": "Entity already queued or crawled"}, status_code=200)
     return JSONResponse(content={"response": "Entity added to queue"}, status_code=200)
 
+def batch_line(site: str, identifier: str, status: str, entity=None, stats=None) -> str:
+    return json.dumps({
+        "site": site,
+        "identifier": identifier,
+        "status": status,
+        "entity": entity.to_dict(drop=['id']) if entity else None,
+        "stats": stats.to_dict() if stats else None,
+    }, default=str) + "\n"
+
+@app.post("/entities/batch")
+async def batch_entities(entities: List[RequestEntity] = Body(...), wait: bool = True):
+    """
+    Look up many (site, identifier) pairs at once, streamed back as NDJSON lines as they resolve:
+    stored entities first (one IN query per site), then the misses as their crawls complete.
+    With `wait=false` misses are queued for the crawl pool instead and reported as "queued".
+    Crawled misses are "crawled", or end as "not_found", "deferred" (out of API quota, queued for
+    later) or "failed".
+    """
+    if len(entities) > BATCH_MAX_ENTITIES:
+        return JSONResponse(content={"error": f"At most {BATCH_MAX_ENTITIES} entities per batch"}, status_code=400)
+    identifiers_by_site: Dict[str, Dict[str, None]] = {}
+    for entity in entities:
+        identifiers_by_site.setdefault(entity.type, {})[entity.identifier] = None  # ordered, deduplicated
+
+    async def crawl_missing(site_worker: SiteWorker, identifier: str):
+        async with state['batch_crawl_slots']:
+            lookup = entity_lookups.submit(
+                state['executor'], (site_worker.name, identifier),
+                site_worker.run, RequestEntity(type=site_worker.name, identifier=identifier)
+            )
+            try:
+                entity = await asyncio.shield(asyncio.wrap_future(lookup))
+            except Exception as e:
+                print(f"Error crawling {site_worker.name}/{identifier}: {e}")
+                return batch_line(site_worker.name, identifier, "failed")
+        if entity is None:
+            # run() only returns the entity, its terminal event tells why there's none
+            latest = event_bus.latest(site_worker.name, identifier)
+            status = latest["type"] if latest and latest["type"] in ("not_found", "deferred") else "failed"
+            return batch_line(site_worker.name, identifier, status)
+        stats = await site_worker.get_entity_stats(identifier, entity=entity)
+        return batch_line(site_worker.name, identifier, "crawled", entity, stats)
+
+    async def lines():
+        crawls = []
+        for site, identifiers in identifiers_by_site.items():
+            site_worker = state['site_workers'].get(site)
+            if site_worker is None:
+                for identifier in identifiers:
+                    yield batch_line(site, identifier, "unsupported")
+                continue
+            stored = {entity.identifier: entity for entity in await site_worker.retrieve_entities(list(identifiers))}
+            missing = []
+            for identifier in identifiers:
+                entity = stored.get(identifier)
+                if entity:
+                    yield batch_line(site, identifier, "found", entity, await site_worker.get_entity_stats(identifier, entity=entity))
+                else:
+                    missing.append(identifier)
+            if not wait:
+                # forced, an entity seen before but not stored (e.g. a failed crawl) is due another try
+                await asyncio.to_thread(
+                    site_worker.queue_entities, [RequestEntity(type=site, identifier=identifier) for identifier in missing],
+                    priority=USER_REQUEST_PRIORITY, force=True,
+                )
+                for identifier in missing:
+                    yield batch_line(site, identifier, "queued")
+            else:
+                crawls.extend(asyncio.ensure_future(crawl_missing(site_worker, identifier)) for identifier in missing)
+        try:
+            for crawl in asyncio.as_completed(crawls):
+                yield await crawl
+        finally:
+            for crawl in crawls:
+                crawl.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def sse_message(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+async def event_stream(site: str, identifier: Optional[str] = None):
+    """Crawl events as server-sent events, a per-entity stream ends with the entity's crawl."""
+    subscription = event_bus.subscribe(site, identifier)
+    try:
+        if identifier is not None:
+            # subscribed first, so nothing falls between the latest event and the live ones
+            latest = event_bus.latest(site, identifier)
+            if latest:
+                yield sse_message(latest)
+                if latest["type"] in TERMINAL_EVENTS:
+                    return
+        while True:
+            event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield sse_message(event)
+            if identifier is not None and event["type"] in TERMINAL_EVENTS:
+                return
+    finally:
+        event_bus.unsubscribe(subscription)
+
+# declared before /{site}/{identifier}, which would otherwise take /events/{site}
+@app.get("/events/{site}")
+async def site_events(site: SupportedSites):
+    """Live crawl events of every entity of a site."""
+    if site.value not in state['site_workers'].keys():
+        return JSONResponse(content={"error": "Site not supported"}, status_code=400)
+    return StreamingResponse(event_stream(site.value), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/events/{site}/{identifier}")
+async def entity_events(site: SupportedSites, identifier: str):
+    """Crawl events of one entity, from its latest one until its crawl ends."""
+    if site.value not in state['site_workers'].keys():
+        return JSONResponse(content={"error": "Site not supported"}, status_code=400)
+    return StreamingResponse(event_stream(site.value, identifier), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/{site}/{identifier}")
-async def get_entity(site: SupportedSites, identifier: str):
+async def get_entity(site: SupportedSites, identifier: str, wait: bool = True):
+    """
+    An entity and its stats, crawled first if it isn't stored yet. With `wait=false` a missing entity
+    answers 202 right away while it's crawled, follow its progress at /events/{site}/{identifier}.
+    """
     if site.value not in state['site_workers'].keys():
         return JSONResponse(content={"error": "Site not supported"}, status_code=400)
-    entity = state['site_workers'][site.value].retrieve_entity(identifier)
+    cache_key = entity_cache_key(site.value, identifier)
+    cached = state['entity_cache'].get(cache_key)
+    if cached is not None:
+        return JSONResponse(content=cached, status_code=200)
+    entity = await state['site_workers'][site.value].retrieve_entity(identifier)
     if not entity: 
-        entity = state['site_workers'][site.value].run(RequestEntity(type=site, identifier=identifier))
-    stats = state['site_workers'][site.value].get_entity_stats(identifier)
+        lookup = entity_lookups.submit(
+            state['executor'], (site.value, identifier),
+            state['site_workers'][site.value].run, RequestEntity(type=site.value, identifier=identifier)
+        )
+        if not wait:
+            return JSONResponse(content={"response": {
+                "status": "pending",
+                "events": f"/events/{site.value}/{identifier}",
+            }}, status_code=202)
+        # shielded, a client hanging up mustn't cancel the crawl other requests are waiting on
+        entity = await asyncio.shield(asyncio.wrap_future(lookup))
+    elif state['site_workers'][site.value].is_stale(entity):
+        # serve what we have and refresh it in the background, so viewed entities stay current
+        await asyncio.to_thread(
+            state['site_workers'][site.value].queue_entities,
+            [RequestEntity(type=site.value, identifier=identifier)], priority=entity.index, force=True,
+        )
+    stats = await state['site_workers'][site.value].get_entity_stats(identifier, entity=entity)
 
-    return JSONResponse(content={"response": {"entity": entity.to_dict(drop=['id']) if entity else None, "stats": stats.to_dict()}}, status_code=200)
+    content = {"response": {"entity": entity.to_dict(drop=['id']) if entity else None, "stats": stats.to_dict()}}
+    if entity:
+        state['entity_cache'].set(cache_key, content, ENTITY_CACHE_TTL)
+    return JSONResponse(content=content, status_code=200)
             
 @app.get("/{site}/ranking/{page}/{per_page}")
 async def top_entities_for_site(site: SupportedSites, page: int, per_page: int):
     if site.value not in state['site_workers'].keys():
         return JSONResponse(content={"error": "Site not supported"}, status_code=400)
     
-    entities, total_count = state['site_workers'][site.value].get_top_entities(page, per_page)
+    entities, total_count = await state['site_workers'][site.value].get_top_entities(page, per_page)
     total_pages = (total_count + per_page - 1) // per_page  # Ceiling division
     
     return JSONResponse(content={
@@ -90,13 +332,45 @@ async def top_entities_for_site(site: SupportedSites, page: int, per_page: int):
     }, status_code=200)
 
 
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode() if cursor else None
+
+def decode_cursor(cursor: str):
+    index, identifier = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return int(index), str(identifier)
+
+@app.get("/{site}/ranking/{per_page}")
+async def top_entities_for_site_after(site: SupportedSites, per_page: int, cursor: Optional[str] = None):
+    """Keyset paginated ranking, pass `next_cursor` from the previous response to get the next page."""
+    if site.value not in state['site_workers'].keys():
+        return JSONResponse(content={"error": "Site not supported"}, status_code=400)
+    if per_page <= 0:
+        return JSONResponse(content={"error": "per_page must be positive"}, status_code=400)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except Exception:
+        return JSONResponse(content={"error": "Invalid cursor"}, status_code=400)
+
+    entities, next_cursor, total_count = await state['site_workers'][site.value].get_top_entities_after(after, per_page)
+
+    return JSONResponse(content={
+        "entities": [entity.to_dict(drop=['id']) for entity in entities],
+        "pagination": {
+            "per_page": per_page,
+            "total_items": total_count,
+            "total_pages": (total_count + per_page - 1) // per_page,
+            "next_cursor": encode_cursor(next_cursor)
+        }
+    }, status_code=200)
+
+
 @app.get("/{site}/search/{query}")
 @limiter.limit("100/minute")
 async def search_entities_for_site(request: Request, site: SupportedSites = Path(...), query: str = Path(...)):
     if site.value not in state['site_workers'].keys():
         return JSONResponse(content={"error": "Site not supported"}, status_code=400)
     
-    entities = state['site_workers'][site.value].search_entities(query, limit=10)
+    entities = await state['site_workers'][site.value].search_entities(query, limit=10)
     
     return JSONResponse(content={
         "suggestions": [
@@ -135,4 +409,19 @@ async def supported_sites():
             site_info['target_entities'] = metadata['target_entities']
             site_info['histogram'] = metadata['histogram']
         sites.append(site_info)
-    return JSONResponse(content={"response": sites}, status_code=200)
\ No newline at end of file
+    return JSONResponse(content={"response": sites}, status_code=200)
+
+@app.get("/cache-stats")
+async def cache_stats():
+    # stats of redis backed caches are redis calls, made off the event loop
+    def collect():
+        return {
+            "entities": state['entity_cache'].stats(),
+            "upstream": {site: site_worker.cache.stats() for site, site_worker in state['site_workers'].items()},
+        }
+    return JSONResponse(content={"response": await asyncio.to_thread(collect)}, status_code=200)
+
+@app.get("/crawl-stats")
+async def crawl_stats():
+    stats = await asyncio.gather(*(asyncio.to_thread(site_worker.crawl_stats) for site_worker in state['site_workers'].values()))
+    return JSONResponse(content={"response": dict(zip(state['site_workers'].keys(), stats))}, status_code=200)
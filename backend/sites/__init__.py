@@ -1,19 +1,36 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Tuple
-from datetime import datetime
-from db.definitions import engine, EntityBase, ToDictMixin, AggregatedMetrics
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from datetime import datetime, timedelta
+from db.definitions import engine, async_engine, EntityBase, ToDictMixin, AggregatedMetrics
 from sqlalchemy.orm import Session
-from sites.types import RequestEntity, Record, EntityInfo
-from sqlalchemy import func
-from functools import lru_cache
+from sqlalchemy.ext.asyncio import AsyncSession
+from sites.types import RequestEntity, Record, RecordArray, EntityInfo
+from core.stats import summarize_index_counts
+from core.rank import RankIndex
+from core.hindex import h_index, build_metric_state, apply_metric_updates
+from core.throughput import ThroughputMeter
+from core.frontier import create_frontier
+from core.journal import create_journal
+from core.http_client import HttpClient
+from core.quota import create_quota, QuotaExceeded
+from core.pagination import map_bounded
+from core.cache import create_cache, request_key
+from core.singleflight import SingleFlight
+from core.events import event_bus
+from core import metrics
+from sqlalchemy import func, tuple_, Index, select, or_, text
+from sqlalchemy.dialects.postgresql import insert
 from dataclasses import dataclass
-from queue import Queue
 from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
 import time
 import math
 import os 
 import requests
 
+logger = logging.getLogger(__name__)
 
 @dataclass
 class EntityStats:
@@ -34,29 +51,139 @@ class SiteWorker(ABC):
     metric_name: str
     primary_color: str
     secondary_color: str
+    # /supported-sites serves an in-memory snapshot, refreshed in the background (see main.py)
+    # built from the in-memory rank index at most every metadata_min_refresh_seconds while writes are pending,
+    # and reconciled with a scan of the site table every metadata_max_staleness_seconds
+    metadata_min_refresh_seconds: float = float(os.getenv("METADATA_MIN_REFRESH_SECONDS", 5))
+    metadata_max_staleness_seconds: float = float(os.getenv("METADATA_MAX_STALENESS_SECONDS", 300))
+    # crawl pool size, subclasses can override e.g. to match their API quota
+    fetch_workers: int = int(os.getenv("CRAWL_FETCH_WORKERS", 4))
+    expand_workers: int = int(os.getenv("CRAWL_EXPAND_WORKERS", 1))
+    # write-behind buffer used by the crawl pool
+    write_batch_size: int = int(os.getenv("WRITE_BATCH_SIZE", 500))
+    write_flush_seconds: float = float(os.getenv("WRITE_FLUSH_SECONDS", 2))
+    # rows kept for the next flush when one fails, the oldest beyond it are requeued to be crawled again
+    write_buffer_max_rows: int = int(os.getenv("WRITE_BUFFER_MAX_ROWS", 5000))
+    # seconds between checks for replicas that died with unwritten rows, see core.journal
+    unwritten_recover_seconds: float = float(os.getenv("UNWRITTEN_RECOVER_SECONDS", 60))
+    # sites implementing entity_updates refresh entities incrementally from their stored metric_state,
+    # tracking the top h + incremental_margin items and doing a full crawl every full_refresh_days
+    supports_incremental: bool = False
+    incremental_margin: int = int(os.getenv("INCREMENTAL_MARGIN", 50))
+    full_refresh_days: float = float(os.getenv("INCREMENTAL_FULL_REFRESH_DAYS", 7))
+    # stored entities older than this are refreshed, at most recrawl_budget_per_hour of them per hour
+    recrawl_min_age_hours: float = float(os.getenv("RECRAWL_MIN_AGE_HOURS", 24))
+    recrawl_budget_per_hour: int = int(os.getenv("RECRAWL_BUDGET_PER_HOUR", 100))
+    # API budget: quota_capacity units refilled at quota_refill_per_second, each call type weighted by
+    # quota_costs (unlimited without a capacity). crawl_cost and expand_cost are the expected spend of one
+    # entity_info and one get_related_entities, the crawl pool only takes work it can pay for.
+    quota_capacity: Optional[float] = None
+    quota_refill_per_second: float = 0.0
+    quota_costs: Dict[str, float] = {}
+    crawl_cost: float = 1.0
+    expand_cost: float = 1.0
+    quota_max_wait_seconds: float = float(os.getenv("QUOTA_MAX_WAIT_SECONDS", 30))
+    # seconds upstream responses of each call type are cached for, call types not listed aren't cached
+    cache_ttls: Dict[str, float] = {}
+    # threads shared by the paginated fetches of entity_info, each fetch keeping at most pagination_window calls in flight
+    pagination_workers: int = int(os.getenv("PAGINATION_WORKERS", 8))
+    pagination_window: int = int(os.getenv("PAGINATION_WINDOW", 4))
 
     def __init__(self):
         # Create a unique entity table class name for this specific site worker
         class_name = f"{self.name.capitalize()}Entity"
         class_dict = {
             '__tablename__': self.name,
-            '__table_args__': {"schema": "sites"}
+            '__table_args__': (
+                # keyset pagination for the ranking, scanned backwards for index DESC, identifier DESC
+                Index(f"ix_{self.name}_index_identifier", "index", "identifier"),
+                # substring and prefix autocomplete for search_entities
+                Index(
+                    f"ix_{self.name}_identifier_trgm", "identifier",
+                    postgresql_using="gin", postgresql_ops={"identifier": "gin_trgm_ops"}
+                ),
+                # staleness filter for the recrawl scheduler
+                Index(f"ix_{self.name}_last_updated_at", "last_updated_at"),
+                {"schema": "sites"},
+            )
         }
         
-        # Use the global engine only for table creation
+        # the table itself is created by db.migrate (see ensure_schema), not on every start
         self.EntityModel = type(class_name, (EntityBase,), class_dict)
-        self.EntityModel.__table__.create(engine, checkfirst=True)
-        self.queue = Queue(maxsize=1000)
-        self.queued_entities = set()  # Track queued entity identifiers
+        # crawl frontier, redis backed (durable and shared between replicas) when REDIS_URL is set
+        self.fetch_queue = create_frontier(self.name, "fetch")  # entities waiting for run(), deduplicated
+        self.expand_queue = create_frontier(self.name, "expand", dedupe=False)  # crawled entities waiting for get_related_entities()
+        self.unwritten = create_journal(self.name)  # this replica's buffered rows not flushed yet, requeued after a crash
+        self._unwritten_recovered_at = None
         self._stop_monitor = False
-        self._monitor_thread = None
+        self._monitor_threads = []
         self._stop_monitor_lock = Lock()
-        
-        # Start the queue monitor thread automatically
-        self.start_queue_monitor()
+        self.throughput = ThroughputMeter()
+        self._write_buffer = []
+        self._write_buffer_lock = Lock()
+        self._last_flush = time.monotonic()
+        self._flush_failed = False
+        self._metadata = None
+        self._metadata_refreshed_at = None
+        self._metadata_reconciled_at = None
+        self._pending_metadata_writes = 0
+        self._metadata_lock = Lock()
+        self.rank_index = RankIndex()
+        self._rank_index_lock = Lock()
+        # shared by the replicas through redis when REDIS_URL is set, otherwise per process
+        self.quota = create_quota(self.name, self.quota_capacity, self.quota_refill_per_second, self.quota_costs)
+        # pooled, retrying HTTP session for sites that talk to their API directly
+        self.cache = create_cache(self.name)
+        self.http = HttpClient(
+            headers=self.http_headers(), quota=self.quota, quota_timeout=self.quota_max_wait_seconds,
+            cache=self.cache, cache_ttls=self.cache_ttls, site=self.name,
+        )
+        self._runs_in_flight = SingleFlight()
+        # identifiers queued by schedule_recrawl, until they leave the fetch queue (discovered entities waiting in it don't count)
+        self._pending_recrawls = set()
+        self._pending_recrawls_lock = Lock()
+        self._heartbeat = time.monotonic()
+        # called with (site name, identifiers) after every committed write, e.g. to invalidate read caches
+        self._write_listeners: List[Callable[[str, List[str]], None]] = []
+        self._pagination_executor = ThreadPoolExecutor(max_workers=self.pagination_workers, thread_name_prefix=f"{self.name}-pages")
+        self.register_gauges()
+        # the crawl pool is started by its owner (main.lifespan), constructing a worker doesn't spawn threads
+
+    def register_gauges(self):
+        """Queue depths, crawl pool liveness and quota, sampled when /metrics is scraped."""
+        metrics.gauge_function(metrics.QUEUE_DEPTH, self.fetch_queue.size, site=self.name, stage="fetch")
+        metrics.gauge_function(metrics.QUEUE_DEPTH, self.expand_queue.size, site=self.name, stage="expand")
+        metrics.gauge_function(metrics.SEEN_ENTITIES, self.fetch_queue.seen_count, site=self.name)
+        metrics.gauge_function(metrics.WORKERS_ALIVE, lambda: sum(1 for thread in self._monitor_threads if thread.is_alive()), site=self.name)
+        metrics.gauge_function(metrics.HEARTBEAT_AGE, lambda: time.monotonic() - self._heartbeat, site=self.name)
+        metrics.gauge_function(metrics.WRITE_BUFFER_ROWS, lambda: len(self._write_buffer), site=self.name)
+        if self.quota.limited:
+            metrics.gauge_function(metrics.QUOTA_AVAILABLE, self.quota.available, site=self.name)
+
+    def emit(self, type: str, identifier: str, **data):
+        """Publish a crawl progress event (started, fetched, indexed, completed...) for the event streams."""
+        event_bus.publish(self.name, identifier, type, **data)
+
+    def add_write_listener(self, listener: Callable[[str, List[str]], None]):
+        self._write_listeners.append(listener)
+
+    def http_headers(self) -> Dict[str, str]:
+        """Default headers (e.g. auth) for every request made through self.http."""
+        return {}
+
+    def ensure_schema(self):
+        """
+        Create the site table, and any columns or indexes added since it was first created.
+        Run by db.migrate, once per deploy.
+        """
+        self.EntityModel.__table__.create(engine, checkfirst=True)
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE sites.{self.name} ADD COLUMN IF NOT EXISTS metric_state JSON"))
+        for index in self.EntityModel.__table__.indexes:
+            index.create(engine, checkfirst=True)
 
     def __del__(self):
-        """Ensure the monitor thread is stopped when the worker is destroyed"""
+        """Ensure the crawl threads are stopped when the worker is destroyed"""
         self.stop_queue_monitor()
 
     @property
@@ -69,153 +196,446 @@ class SiteWorker(ABC):
         with self._stop_monitor_lock:
             self._stop_monitor = value
 
-    def calculate_h_index(self,records: List[Record]) -> int:
-        total = sum(record.metric for record in records)
-        records.sort(key=lambda x: x.metric, reverse=True)
-        for i, record in enumerate(records):
-            if record.metric < i + 1:
-                return i, total
-        return len(records),total
+    def reserve(self, call_type: str):
+        """
+        Reserve the budget of one API call made through an SDK (self.http does it on its own).
+        Raises QuotaExceeded instead of waiting longer than quota_max_wait_seconds.
+        """
+        if not self.quota.reserve(call_type, timeout=self.quota_max_wait_seconds, should_stop=lambda: self.stop_monitor):
+            raise QuotaExceeded(f"{self.name} quota exhausted for {call_type}")
+        metrics.UPSTREAM_CALLS.labels(self.name, call_type).inc()
+
+    def cached(self, call_type: str, key, fetch: Callable):
+        """
+        Result of an SDK call from the response cache when its call type has a TTL, `key` identifies
+        the request (e.g. its URI) and `fetch` makes it on a miss. Results must be JSON serializable.
+        """
+        ttl = self.cache_ttls.get(call_type, 0)
+        if ttl <= 0:
+            return fetch()
+        return self.cache.get_or_fetch(request_key(call_type, key), fetch, ttl)
+
+    def fetch_pages(self, fetch: Callable, items: Iterable, max_in_flight: Optional[int] = None) -> Iterator:
+        """
+        Run `fetch` over `items` (page numbers, id batches...) concurrently and yield the results in order.
+        `items` can be a generator walking page tokens, batches start as soon as it yields them.
+        """
+        return map_bounded(self._pagination_executor, fetch, items, max_in_flight or self.pagination_window)
+
+    def calculate_h_index(self, records: Union[RecordArray, Iterable[Union[Record, int]]]) -> Tuple[int, int]:
+        """
+        Returns (h-index, total metrics) in a single streaming pass, so entity_info can
+        hand back a RecordArray, or a generator of records or plain metrics, instead of a list of Records.
+        """
+        if isinstance(records, RecordArray):
+            return h_index(records.metrics)
+        return h_index(record if isinstance(record, int) else record.metric for record in records)
 
     @abstractmethod
     def entity_info(self, entity: RequestEntity) -> EntityInfo:
-        """Fetch all records for a given entity."""
+        """Fetch all records for a given entity. Records can be yielded lazily, as Records or bare metrics."""
         pass
     
     @abstractmethod
     def get_related_entities(self, entity: RequestEntity) -> List[RequestEntity]:
         pass
 
-    # @lru_cache(maxsize=1000)
-    def retrieve_entity(self, identifier: str):
-        with Session(engine, expire_on_commit=False) as session: 
-            existing_entity = session.query(self.EntityModel).filter(self.EntityModel.identifier == identifier).first()            
-            return existing_entity
+    def entity_updates(self, entity: RequestEntity, since: Optional[datetime], tracked: List[str]) -> Optional[Tuple[EntityInfo, Dict[str, int]]]:
+        """
+        Optional, for sites with supports_incremental. Return an EntityInfo whose RecordArray holds only
+        the records created after `since` (with links and created_at), and the current metric of each
+        tracked record, keyed by link. None, the default, means a full crawl instead.
+        """
+        return None
+
+    async def retrieve_entity(self, identifier: str):
+        async with AsyncSession(async_engine, expire_on_commit=False) as session: 
+            result = await session.execute(select(self.EntityModel).where(self.EntityModel.identifier == identifier))
+            return result.scalars().first()
+
+    async def retrieve_entities(self, identifiers: List[str]):
+        """Stored entities among `identifiers`, in a single IN query."""
+        if not identifiers:
+            return []
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            result = await session.execute(select(self.EntityModel).where(self.EntityModel.identifier.in_(identifiers)))
+            return result.scalars().all()
     
-    def get_entity_stats(self, identifier: str) -> EntityStats:
-        with Session(engine, expire_on_commit=False) as session: 
-            existing_entity = session.query(self.EntityModel).filter(self.EntityModel.identifier == identifier).first()
-            stats = EntityStats(percentile=0.0)
-            if existing_entity:
-                # Calculate total count and number of entities with higher index
-                total_count = session.query(self.EntityModel).count()
-                higher_count = session.query(self.EntityModel).filter(
-                    self.EntityModel.index > existing_entity.index
-                ).count()
-                
+    def ensure_rank_index(self) -> RankIndex:
+        """Load the rank index from the site table on first use."""
+        if not self.rank_index.loaded:
+            with self._rank_index_lock:
+                if not self.rank_index.loaded:
+                    with Session(engine) as session:
+                        self.rank_index.load(self.get_index_counts(session))
+        return self.rank_index
+
+    async def load_rank_index(self) -> RankIndex:
+        """ensure_rank_index for the request path, the first load runs off the event loop."""
+        if self.rank_index.loaded:
+            return self.rank_index
+        return await asyncio.to_thread(self.ensure_rank_index)
+
+    async def get_entity_stats(self, identifier: str, entity=None) -> EntityStats:
+        """
+        Percentile of an entity within its site, answered from the rank index instead of counting rows.
+        Pass `entity` when it's already loaded to skip the lookup.
+        """
+        if entity is None:
+            entity = await self.retrieve_entity(identifier)
+        stats = EntityStats(percentile=0.0)
+        if entity:
+            rank_index = await self.load_rank_index()
+            total_count = rank_index.total
+            if total_count > 0:
+                higher_count = rank_index.count_greater(entity.index)
                 # Calculate percentile (100 means top, 0 means bottom)
                 percentile = ((total_count - higher_count) / total_count) * 100
                 stats = EntityStats(percentile=round(percentile, 2))
-            return stats
-
-                
-
-    def update_entity(self, entity_info: EntityInfo,session: Session,index: int = 0 ,total_metrics: int = 0):
-        entity_model = self.EntityModel(
-            identifier=entity_info.metadata.identifier,
-            index=index,
-            total_metrics=total_metrics,
-            last_updated_at=datetime.now(),
-            url=entity_info.metadata.url,
-            created_at=entity_info.metadata.created_at
+        return stats
+
+    def _entity_row(self, entity_info: EntityInfo, index: int, total_metrics: int, metric_state: dict = None):
+        return {
+            "identifier": entity_info.metadata.identifier,
+            "index": index,
+            "total_metrics": total_metrics,
+            "last_updated_at": datetime.now(),
+            "url": entity_info.metadata.url,
+            "created_at": entity_info.metadata.created_at,
+            "metric_state": metric_state,
+        }
+
+    def write_entities(self, rows: List[dict], session: Session):
+        """
+        Upsert a batch of entity rows with a single INSERT ... ON CONFLICT and commit.
+        Site statistics aren't touched here, the batch is accounted for once by the metadata refresher.
+        """
+        if not rows:
+            return
+        # the same entity twice in one statement is an error for ON CONFLICT, keep the latest
+        rows = list({row["identifier"]: row for row in rows}.values())
+        identifiers = [row["identifier"] for row in rows]
+        previous_indices = dict(
+            session.query(self.EntityModel.identifier, self.EntityModel.index)
+            .filter(self.EntityModel.identifier.in_(identifiers))
+            .all()
+        )
+        statement = insert(self.EntityModel).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[self.EntityModel.identifier],
+            set_={
+                "index": statement.excluded.index,
+                "total_metrics": statement.excluded.total_metrics,
+                "last_updated_at": statement.excluded.last_updated_at,
+                "url": statement.excluded.url,
+                "metric_state": statement.excluded.metric_state,
+                # not every site knows when an account was created, don't forget it once we do
+                "created_at": func.coalesce(statement.excluded.created_at, self.EntityModel.created_at),
+            }
         )
-        merged_entity = session.merge(entity_model)
-        session.commit()
-        return merged_entity
+        with metrics.timed(self.name, "write_entities"):
+            session.execute(statement)
+            session.commit()
+        metrics.WRITE_BATCH_ROWS.labels(self.name).observe(len(rows))
+        if self.rank_index.loaded:
+            for row in rows:
+                self.rank_index.update(previous_indices.get(row["identifier"]), row["index"])
+        with self._metadata_lock:
+            self._pending_metadata_writes += len(rows)
+        for listener in self._write_listeners:
+            try:
+                listener(self.name, identifiers)
+            except Exception:
+                logger.exception("Error in write listener for %s", self.name)
+
+    def update_entity(self, entity_info: EntityInfo,session: Session,index: int = 0 ,total_metrics: int = 0, metric_state: dict = None):
+        row = self._entity_row(entity_info, index, total_metrics, metric_state)
+        self.write_entities([row], session)
+        return self.EntityModel(**row)
+
+    def buffer_entity(self, entity_info: EntityInfo, index: int = 0, total_metrics: int = 0, metric_state: dict = None):
+        """
+        Write-behind version of update_entity for the crawl pool, rows are flushed in
+        batches of `write_batch_size` or every `write_flush_seconds`.
+        """
+        row = self._entity_row(entity_info, index, total_metrics, metric_state)
+        self.unwritten.record(row["identifier"], index)
+        with self._write_buffer_lock:
+            self._write_buffer.append(row)
+            # after a failed flush, retries wait for the next due flush instead of every crawl
+            full = len(self._write_buffer) >= self.write_batch_size and not self._flush_failed
+        if full:
+            self.flush_writes()
+        return self.EntityModel(**row)
+
+    def flush_writes(self, only_if_due: bool = False):
+        """
+        Write the buffered rows. If that fails they go back to the buffer for the next flush, and
+        the crawled entities are only marked seen and expanded once their rows are written.
+        """
+        with self._write_buffer_lock:
+            if only_if_due and time.monotonic() - self._last_flush < self.write_flush_seconds:
+                return
+            rows, self._write_buffer = self._write_buffer, []
+            self._last_flush = time.monotonic()
+        if not rows:
+            return
+        try:
+            with Session(engine) as session:
+                self.write_entities(rows, session)
+        except Exception:
+            logger.exception("Error writing %d entities for %s, keeping them for the next flush", len(rows), self.name)
+            self._restore_rows(rows)
+            return
+        self._flush_failed = False
+        self.unwritten.remove(row["identifier"] for row in rows)
+        for row in rows:
+            self._entity_written(row["identifier"], row["index"])
+            self.emit("completed", row["identifier"], entity=self.EntityModel(**row).to_dict(drop=['id']))
+
+    def _restore_rows(self, rows: List[dict]):
+        """Put the rows of a failed flush back in front of the buffer, requeueing the oldest beyond write_buffer_max_rows."""
+        with self._write_buffer_lock:
+            self._flush_failed = True
+            self._write_buffer = rows + self._write_buffer
+            overflow = len(self._write_buffer) - self.write_buffer_max_rows
+            requeued, self._write_buffer = self._write_buffer[:max(overflow, 0)], self._write_buffer[max(overflow, 0):]
+        for row in requeued:
+            self.fetch_queue.push(row["identifier"], priority=row["index"], force=True)
+        self.unwritten.remove(row["identifier"] for row in requeued)
+
+    def _entity_written(self, identifier: str, index: int):
+        """
+        An entity counts as crawled once its row is stored, and only then are its related entities
+        fetched, expansion being the expensive call. Neighbourhoods of high index entities are explored first.
+        """
+        self.fetch_queue.mark_seen(identifier)
+        self.expand_queue.push(identifier, priority=index)
+        self.emit("related_queued", identifier, priority=index)
+
+    def requeue_unwritten(self, only_if_due: bool = False) -> int:
+        """
+        Queue entities crawled but never written again: the journal of a replica that died with
+        rows in its write buffer. Live replicas' journals are left alone, they still hold the rows.
+        """
+        if only_if_due and self._unwritten_recovered_at is not None and \
+                time.monotonic() - self._unwritten_recovered_at < self.unwritten_recover_seconds:
+            return 0
+        self._unwritten_recovered_at = time.monotonic()
+        requeued = 0
+        for identifier, index in self.unwritten.recover():
+            if self.fetch_queue.push(identifier, priority=index, force=True):
+                requeued += 1
+        if requeued:
+            logger.warning("Requeued %d %s entities crawled but never written", requeued, self.name)
+        return requeued
     
-    def run(self, entity: RequestEntity):
+    def load_metric_state(self, identifier: str) -> Tuple[Optional[dict], int]:
+        with Session(engine) as session:
+            row = session.query(self.EntityModel.metric_state, self.EntityModel.total_metrics)\
+                .filter(self.EntityModel.identifier == identifier)\
+                .first()
+        return (row[0], row[1] or 0) if row else (None, 0)
+
+    def crawl(self, entity: RequestEntity) -> Tuple[Optional[EntityInfo], int, int, Optional[dict]]:
+        """
+        Fetch an entity and compute its index, returns (entity_info, index, total, metric_state).
+        Sites that support it are refreshed incrementally from the stored metric_state until a full refresh is due.
+        """
+        if self.supports_incremental:
+            state, total = self.load_metric_state(entity.identifier)
+            full_refresh_due = not state or not state.get("full_refresh_at") or \
+                datetime.fromisoformat(state["full_refresh_at"]) < datetime.now() - timedelta(days=self.full_refresh_days)
+            updates = None
+            if not full_refresh_due:
+                since = datetime.fromisoformat(state["watermark"]) if state.get("watermark") else None
+                with metrics.timed(self.name, "entity_updates"):
+                    updates = self.entity_updates(entity, since, list(state.get("tracked", {})))
+            if updates is not None:
+                entity_info, rechecked = updates
+                self.emit("fetched", entity.identifier, records=len(entity_info.records), incremental=True)
+                new_rows = ((link, metric, created_at) for metric, link, _, created_at in entity_info.records.rows())
+                index, total, state = apply_metric_updates(state, total, new_rows, rechecked, self.incremental_margin)
+                self.emit("indexed", entity.identifier, index=index, total_metrics=total)
+                return entity_info, index, total, state
+
+        # sites streaming their records spend most of the fetch in calculate_h_index, which consumes them
+        with metrics.timed(self.name, "entity_info"):
+            entity_info = self.entity_info(entity)
+        if not entity_info:
+            return None, 0, 0, None
+        # streamed records are only counted once the index is computed
+        records = len(entity_info.records) if isinstance(entity_info.records, RecordArray) else None
+        self.emit("fetched", entity.identifier, records=records, incremental=False)
+        with metrics.timed(self.name, "calculate_h_index"):
+            index, total = self.calculate_h_index(entity_info.records)
+        self.emit("indexed", entity.identifier, index=index, total_metrics=total)
+        state = None
+        if self.supports_incremental and isinstance(entity_info.records, RecordArray):
+            rows = ((link, metric, created_at) for metric, link, _, created_at in entity_info.records.rows())
+            state = build_metric_state(rows, index, self.incremental_margin)
+        return entity_info, index, total, state
+
+    def run(self, entity: RequestEntity, buffered: bool = False):
         """
-        Each thread should have its own session
+        Each thread should have its own session.
+        With `buffered` the entity is written by the next batch flush instead of right away.
+        Concurrent runs for the same identifier (request path and crawl pool alike) share a single crawl.
         """
+        return self._runs_in_flight.do(entity.identifier, self._run, entity, buffered)
+
+    def _run(self, entity: RequestEntity, buffered: bool = False):
         updated_entity = None
+        self.emit("started", entity.identifier)
         try:
-            entity_info = self.entity_info(entity)
+            entity_info, index, total, metric_state = self.crawl(entity)
             if not entity_info:
+                self.emit("not_found", entity.identifier)
+                metrics.ENTITIES_CRAWLED.labels(self.name, "not_found").inc()
                 return None 
-            index, total = self.calculate_h_index(entity_info.records)
-            with Session(engine, expire_on_commit=False) as session:
-                updated_entity = self.update_entity(entity_info,session=session,index=index,total_metrics=total)
-                metadata = session.query(AggregatedMetrics).filter(AggregatedMetrics.sites == self.name).first()
-                if metadata:
-                    metadata.current_entities += 1
-                    metadata.index_mean = (metadata.index_mean * (metadata.current_entities - 1) + index) / metadata.current_entities
-                    metadata.index_median = session.query(
-                        func.percentile_cont(0.5)
-                        .within_group(self.EntityModel.index.asc())
-                    ).scalar()
-                    metadata.index_stddev = (((metadata.current_entities-2)*((metadata.index_stddev)**2)/(metadata.current_entities-1)) + ((index - metadata.index_mean)**2)/(metadata.current_entities))**0.5
-                    metadata.index_min = min(metadata.index_min, index)
-                    metadata.index_max = max(metadata.index_max, index)
-                    session.commit()
-                else:
-                    #metada doesn't exist for the site will have to compute for the existing entries 
-                    current_entities = session.query(self.EntityModel).count()
-                    mean = session.query(self.EntityModel).with_entities(func.avg(self.EntityModel.index)).scalar()
-                    # Calculate median using percentile_cont
-                    median = session.query(
-                        func.percentile_cont(0.5)
-                        .within_group(self.EntityModel.index.asc())
-                    ).scalar()
-                    stddev = session.query(self.EntityModel).with_entities(func.stddev(self.EntityModel.index)).scalar()
-                    metadata_min = session.query(self.EntityModel).with_entities(func.min(self.EntityModel.index)).scalar()
-                    metadata_max = session.query(self.EntityModel).with_entities(func.max(self.EntityModel.index)).scalar()
-                    metadata = AggregatedMetrics(sites=self.name, current_entities=current_entities, index_mean=mean, index_median=median, index_stddev=stddev, index_min=metadata_min, index_max=metadata_max)
-                    session.add(metadata)
-                    session.commit()
-            
-            # Remove the related entities call from here
-            # The queue monitor will handle this
-            self.queue.put((entity, True))  # True indicates this entity needs related entities fetched
+            if buffered:
+                # the flush that writes it queues its expansion and publishes completed
+                updated_entity = self.buffer_entity(entity_info, index=index, total_metrics=total, metric_state=metric_state)
+                self.emit("buffered", entity.identifier, entity=updated_entity.to_dict(drop=['id']))
+            else:
+                with Session(engine, expire_on_commit=False) as session:
+                    updated_entity = self.update_entity(entity_info,session=session,index=index,total_metrics=total,metric_state=metric_state)
+                self._entity_written(entity.identifier, index)
+                self.emit("completed", entity.identifier, entity=updated_entity.to_dict(drop=['id']))
+            metrics.ENTITIES_CRAWLED.labels(self.name, "completed").inc()
+        except QuotaExceeded as e:
+            # out of budget, put it back for when the quota refills
+            logger.warning("Deferring entity %s: %s", entity.identifier, e)
+            self.fetch_queue.push(entity.identifier, force=True)
+            self.emit("deferred", entity.identifier, error=str(e))
+            metrics.ENTITIES_CRAWLED.labels(self.name, "deferred").inc()
         except Exception as e:
-            print(f"Error updating entity {entity.identifier}: {e}")
+            logger.exception("Error updating entity %s", entity.identifier)
+            self.emit("failed", entity.identifier, error=str(e))
+            metrics.ENTITIES_CRAWLED.labels(self.name, "failed").inc()
         return updated_entity
     
-    def get_metadata(self):
+    def get_index_counts(self, session: Session) -> List[Tuple[int, int]]:
+        """
+        Frequency table of index values for this site, a single grouped scan.
+        h-indices are small integers so this stays tiny even for large tables.
+        """
+        return session.query(self.EntityModel.index, func.count())\
+            .group_by(self.EntityModel.index)\
+            .all()
+
+    def refresh_metadata(self, reconcile: Optional[bool] = None):
+        """
+        Recompute the site statistics snapshot. In between reconciles it's summarized from the
+        rank index, which every write keeps current, so the site table isn't touched. Reconciling
+        (every metadata_max_staleness_seconds, or while the rank index isn't loaded) does a single
+        grouped scan, resyncs the rank index with what other replicas wrote and stores the snapshot
+        in meta.sites. Called from the background refresher, never on the request path.
+        """
+        with self._metadata_lock:
+            pending = self._pending_metadata_writes
+            previous = self._metadata
+            if reconcile is None:
+                reconcile = self._metadata_reconciled_at is None or \
+                    time.monotonic() - self._metadata_reconciled_at >= self.metadata_max_staleness_seconds
+        reconcile = reconcile or not self.rank_index.loaded
+        if reconcile:
+            snapshot = self._reconcile_metadata()
+        else:
+            snapshot = self._snapshot_from_summary(summarize_index_counts(self.rank_index.index_counts()), previous)
+        with self._metadata_lock:
+            self._metadata = snapshot
+            self._metadata_refreshed_at = time.monotonic()
+            if reconcile:
+                self._metadata_reconciled_at = self._metadata_refreshed_at
+            # writes that landed while we were summarizing stay pending for the next refresh
+            self._pending_metadata_writes -= pending
+        return snapshot
+
+    def _reconcile_metadata(self):
         with Session(engine, expire_on_commit=False) as session:
+            index_counts = self.get_index_counts(session)
+            # resync the rank index too, it drifts when other replicas write
+            self.rank_index.load(index_counts)
+            summary = summarize_index_counts(index_counts)
             metadata = session.query(AggregatedMetrics).filter(AggregatedMetrics.sites == self.name).first()
-            data = metadata
-            
-            if not data: 
-                return None
-                
-            data = data.to_dict()
-            data['target_entities'] = -1 # TODO: bring back implementation of this
-            data["1q"] = data["index_mean"] - 0.674*data["index_stddev"] #assuming normal distribution here, meh its fine. 
-            data["3q"] = data["index_mean"] + 0.674*data["index_stddev"]
-            # Calculate histogram data
-            # First get min and max index values
-            min_index = session.query(func.min(self.EntityModel.index)).scalar() or 0
-            max_index = session.query(func.max(self.EntityModel.index)).scalar() or 0
-            
-            # Create 10 buckets
-            bucket_size = (max_index - min_index) / 10 if max_index > min_index else 1
-            total_count = session.query(self.EntityModel).count()
-            
-            histogram_data = []
-            for i in range(10):
-                bucket_start = min_index + (i * bucket_size)
-                bucket_end = min_index + ((i + 1) * bucket_size)
-                
-                # Count entities in this bucket
-                count = session.query(self.EntityModel).filter(
-                    self.EntityModel.index >= bucket_start,
-                    self.EntityModel.index < (bucket_end if i < 9 else bucket_end + 0.1)  # Include max value in last bucket
-                ).count()
-                
-                histogram_data.append({
-                    "bucket_start": round(bucket_start, 2),
-                    "bucket_end": round(bucket_end, 2),
-                    "count": count,
-                    "percentage": round((count*100/ total_count) if total_count > 0 else 0, 2)
-                })
-            
-            data['histogram'] = histogram_data
-            
-            return data
+            if summary:
+                if not metadata:
+                    metadata = AggregatedMetrics(sites=self.name)
+                    session.add(metadata)
+                metadata.current_entities = summary['current_entities']
+                metadata.index_mean = summary['index_mean']
+                metadata.index_median = summary['index_median']
+                metadata.index_stddev = summary['index_stddev']
+                metadata.index_min = summary['index_min']
+                metadata.index_max = summary['index_max']
+                metadata.index_1q = summary['1q']
+                metadata.index_3q = summary['3q']
+                metadata.histogram = summary['histogram']
+                session.commit()
+            return self._snapshot_from_row(metadata)
+
+    def load_metadata(self):
+        """Seed the snapshot from the stored meta.sites row (a primary key lookup), run at startup."""
+        with Session(engine, expire_on_commit=False) as session:
+            metadata = session.query(AggregatedMetrics).filter(AggregatedMetrics.sites == self.name).first()
+        snapshot = self._snapshot_from_row(metadata)
+        with self._metadata_lock:
+            if self._metadata is None:
+                self._metadata = snapshot
+        return snapshot
+
+    def metadata_needs_refresh(self) -> bool:
+        with self._metadata_lock:
+            if self._metadata_reconciled_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._metadata_reconciled_at >= self.metadata_max_staleness_seconds:
+                return True
+            return self._pending_metadata_writes > 0 and now - self._metadata_refreshed_at >= self.metadata_min_refresh_seconds
+
+    @staticmethod
+    def _snapshot_from_row(metadata: Optional[AggregatedMetrics]):
+        if not metadata:
+            return None
+        data = metadata.to_dict()
+        data['target_entities'] = -1 # TODO: bring back implementation of this
+        data["1q"] = data.pop("index_1q")
+        data["3q"] = data.pop("index_3q")
+        data["histogram"] = data["histogram"] or []
+        return data
+
+    def _snapshot_from_summary(self, summary: Optional[dict], previous: Optional[dict] = None):
+        """Same shape as _snapshot_from_row, fields the summary doesn't cover are kept from the previous snapshot."""
+        if not summary:
+            return previous
+        return {
+            **(previous or {"sites": self.name, "target_entities": -1}),
+            "current_entities": summary["current_entities"],
+            "index_mean": summary["index_mean"],
+            "index_median": summary["index_median"],
+            "index_stddev": summary["index_stddev"],
+            "index_min": summary["index_min"],
+            "index_max": summary["index_max"],
+            "1q": summary["1q"],
+            "3q": summary["3q"],
+            "histogram": summary["histogram"],
+            "last_updated_at": datetime.now().isoformat(),
+        }
+
+    def get_metadata(self):
+        """
+        Return the latest statistics snapshot without touching the database, seeded by
+        load_metadata at startup and kept fresh by refresh_metadata. None until then.
+        """
+        with self._metadata_lock:
+            return self._metadata
     
-    def get_top_entities(self, page: int = 1, per_page: int = 10):
+    async def get_top_entities(self, page: int = 1, per_page: int = 10):
         """
         Retrieve paginated top-ranking entities sorted by index in descending order.
+        The rank index locates the index value the page starts at, so the database only
+        skips over entities tied on that value instead of every entity before the page.
         
         Args:
             page: Page number (1-based indexing)
@@ -226,108 +646,225 @@ class SiteWorker(ABC):
             - List of entities for the requested page
             - Total count of entities
         """
-        with Session(engine, expire_on_commit=False) as session:
-            # Get total count
-            total_count = session.query(self.EntityModel).count()
-            
-            # Get paginated results
-            offset = (page - 1) * per_page
-            entities = (
-                session.query(self.EntityModel)
-                .order_by(self.EntityModel.index.desc())
-                .offset(offset)
+        rank_index = await self.load_rank_index()
+        total_count = rank_index.total
+        offset = (page - 1) * per_page
+        start_index = rank_index.value_at_rank(offset)
+        if start_index is None:
+            return [], total_count
+        skip = offset - rank_index.count_greater(start_index)
+
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            result = await session.execute(
+                select(self.EntityModel)
+                .where(self.EntityModel.index <= start_index)
+                .order_by(self.EntityModel.index.desc(), self.EntityModel.identifier.desc())
+                .offset(skip)
                 .limit(per_page)
-                .all()
             )
-            return entities, total_count
-    
-    def queue_entities(self, entities: List[RequestEntity]) -> List[bool]:
+            return result.scalars().all(), total_count
+
+    async def get_top_entities_after(self, cursor: Optional[Tuple[int, str]] = None, per_page: int = 10):
         """
-        Attempt to queue multiple entities if they haven't been queued before.
-        Returns a list of booleans indicating success/failure for each entity.
+        Cursor based ranking, constant time per page regardless of depth.
+
+        Args:
+            cursor: (index, identifier) of the last entity of the previous page, None for the first page
+            per_page: Number of entities per page
+
+        Returns:
+            Tuple containing:
+            - List of entities for the requested page
+            - Cursor for the next page, None when this is the last page
+            - Total count of entities (from the rank index, no count query)
         """
-        results = []
-        for entity in entities:
-            if entity.identifier not in self.queued_entities:
-                try:
-                    self.queue.put((entity, False))  # False indicates no need to fetch related entities
-                    self.queued_entities.add(entity.identifier)
-                    results.append(True)
-                except Queue.Full:
-                    results.append(False)
-            else:
-                results.append(False)
-        return results
+        query = select(self.EntityModel)
+        if cursor is not None:
+            query = query.where(
+                tuple_(self.EntityModel.index, self.EntityModel.identifier) < tuple_(*cursor)
+            )
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            result = await session.execute(
+                query
+                .order_by(self.EntityModel.index.desc(), self.EntityModel.identifier.desc())
+                .limit(per_page)
+            )
+            entities = result.scalars().all()
+        next_cursor = (entities[-1].index, entities[-1].identifier) if len(entities) == per_page else None
+        rank_index = await self.load_rank_index()
+        return entities, next_cursor, rank_index.total
     
-    def get_entity_from_queue(self) -> Optional[Tuple[RequestEntity, bool]]:
+    def queue_entities(self, entities: List[RequestEntity], priority: float = 0.0, force: bool = False) -> List[bool]:
         """
-        Get and remove an entity from the queue.
-        Returns a tuple of (entity, needs_related) or None if queue is empty.
+        Attempt to queue multiple entities if they haven't been queued or crawled before.
+        `force` queues them regardless, e.g. to refresh stale entities.
+        Returns a list of booleans indicating success/failure for each entity.
         """
-        if not self.queue.empty():
-            entity, needs_related = self.queue.get()
-            if entity.identifier in self.queued_entities:
-                self.queued_entities.remove(entity.identifier)
-            return entity, needs_related
-        return None, False
+        return self.fetch_queue.push_many([entity.identifier for entity in entities], priority=priority, force=force)
 
     def start_queue_monitor(self):
         """
-        Start the queue monitoring thread if it's not already running.
+        Start the crawl pool if it's not already running: `fetch_workers` threads crawling
+        queued entities and `expand_workers` threads discovering related entities.
         """
-        if self._monitor_thread is None or not self._monitor_thread.is_alive():
-            self._stop_monitor = False
-            self._monitor_thread = Thread(target=self._monitor_queue, daemon=True)
-            self._monitor_thread.start()
+        self._monitor_threads = [thread for thread in self._monitor_threads if thread.is_alive()]
+        if self._monitor_threads:
+            return
+        self.requeue_unwritten()
+        self.stop_monitor = False
+        for i in range(self.fetch_workers):
+            self._monitor_threads.append(Thread(target=self._fetch_loop, name=f"{self.name}-fetch-{i}", daemon=True))
+        for i in range(self.expand_workers):
+            self._monitor_threads.append(Thread(target=self._expand_loop, name=f"{self.name}-expand-{i}", daemon=True))
+        for thread in self._monitor_threads:
+            thread.start()
 
     def stop_queue_monitor(self):
         """
-        Signal the queue monitoring thread to stop and wait for it to finish.
+        Signal the crawl threads to stop and wait for them to finish.
+        """
+        self.stop_monitor = True
+        for thread in self._monitor_threads:
+            if thread.is_alive():
+                thread.join()
+        self._monitor_threads = []
+        self.flush_writes()
+
+    def _fetch_loop(self):
+        """
+        Fetch stage of the crawl pool: crawl and store queued entities.
+        This method runs in a separate thread.
         """
-        self._stop_monitor = True
-        if self._monitor_thread and self._monitor_thread.is_alive():
-            self._monitor_thread.join()
-            self._monitor_thread = None
+        while not self.stop_monitor:
+            self._heartbeat = time.monotonic()
+            try:
+                self.flush_writes(only_if_due=True)
+                self.unwritten.heartbeat()
+                self.requeue_unwritten(only_if_due=True)
+                # leave the work queued (for replicas or sites with budget) until this one can pay for it
+                wait = self.quota.wait_time(self.crawl_cost)
+                if wait > 0:
+                    time.sleep(min(wait, 0.5))
+                    continue
+                item = self.fetch_queue.pop(timeout=0.5)
+                if item is None:
+                    continue
+                entity = RequestEntity(type=self.name, identifier=item[0])
+                if self.run(entity, buffered=True) is not None:
+                    self.throughput.mark()
+            except Exception:
+                logger.exception("Error in %s crawl fetch stage", self.name)
+                time.sleep(1)
 
-    def _monitor_queue(self):
+    def _expand_loop(self):
         """
-        Monitor the queue and process entities as they arrive.
+        Expansion stage of the crawl pool: queue the related entities of crawled entities.
         This method runs in a separate thread.
         """
         while not self.stop_monitor:
+            self._heartbeat = time.monotonic()
+            wait = self.quota.wait_time(self.expand_cost)
+            if wait > 0:
+                time.sleep(min(wait, 0.5))
+                continue
             try:
-                item = self.get_entity_from_queue()
-                if item:
-                    entity, needs_related = item
-                    
-                    # Only fetch related entities if needed
-                    if needs_related:
-                        try:
-                            related_entities = self.get_related_entities(entity)
-                            #remove current entity from the list
-                            related_entities = [e for e in related_entities if e.identifier != entity.identifier]
-                            self.queue_entities(related_entities)
-                        except Exception as e:
-                            print(f"Error fetching related entities for {entity.identifier}: {e}")
-                    else:
-                        if entity: self.run(entity)
-                else:
-                    # Sleep briefly when queue is empty to prevent CPU spinning
-                    time.sleep(0.1)
-            except Exception as e:
-                print(f"Error in queue monitor: {e}")
-                # Sleep briefly after an error before retrying
+                item = self.expand_queue.pop(timeout=0.5)
+            except Exception:
+                logger.exception("Error in %s crawl expansion stage", self.name)
                 time.sleep(1)
+                continue
+            if item is None:
+                continue
+            identifier, parent_index = item
+            try:
+                with metrics.timed(self.name, "get_related_entities"):
+                    related_entities = self.get_related_entities(RequestEntity(type=self.name, identifier=identifier))
+                #remove current entity from the list
+                related_entities = [e for e in related_entities if e.identifier != identifier]
+                queued = self.queue_entities(related_entities, priority=parent_index)
+                self.emit("related_discovered", identifier, related=len(related_entities), queued=sum(queued))
+            except QuotaExceeded as e:
+                logger.warning("Deferring related entities of %s: %s", identifier, e)
+                self.expand_queue.push(identifier, priority=parent_index)
+            except Exception:
+                logger.exception("Error fetching related entities for %s", identifier)
 
-    def search_entities(self, query: str, limit: int = 10):
+    def crawl_stats(self):
+        return {
+            "fetch_queue": self.fetch_queue.size(),
+            "expand_queue": self.expand_queue.size(),
+            "seen_entities": self.fetch_queue.seen_count(),
+            "pending_recrawls": self.pending_recrawls(),
+            "workers_alive": sum(1 for thread in self._monitor_threads if thread.is_alive()),
+            "entities_per_second": round(self.throughput.rate(), 3),
+            "entities_crawled": self.throughput.total,
+            "quota_available": round(self.quota.available(), 1) if self.quota.limited else None,
+            "response_cache": self.cache.stats(),
+        }
+
+    def is_stale(self, entity) -> bool:
+        return entity.last_updated_at is None or \
+            entity.last_updated_at < datetime.now() - timedelta(hours=self.recrawl_min_age_hours)
+
+    def select_stale_entities(self, limit: int) -> List[Tuple[str, int]]:
+        """
+        Pick up to `limit` (identifier, index) pairs that are due a refresh, ranked by
+        staleness weighted by index so the leaderboard stays current before the long tail.
+        """
+        cutoff = datetime.now() - timedelta(hours=self.recrawl_min_age_hours)
+        age_seconds = func.extract('epoch', func.now() - func.coalesce(self.EntityModel.last_updated_at, self.EntityModel.created_at, cutoff))
         with Session(engine) as session:
-            # Create a search pattern with wildcards
-            search_pattern = f"%{query}%"
-            
-            # Get top matching results
-            entities = session.query(self.EntityModel)\
-                .filter(self.EntityModel.identifier.ilike(search_pattern))\
-                .order_by(self.EntityModel.index.desc())\
+            return session.query(self.EntityModel.identifier, self.EntityModel.index)\
+                .filter(or_(self.EntityModel.last_updated_at < cutoff, self.EntityModel.last_updated_at.is_(None)))\
+                .order_by(((self.EntityModel.index + 1) * age_seconds).desc())\
                 .limit(limit)\
                 .all()
-            return entities
\ No newline at end of file
+
+    def schedule_recrawl(self, budget: int) -> int:
+        """
+        Queue up to `budget` stale entities for the crawl pool, returns how many were queued.
+        Refreshes still pending from earlier calls count against the budget, and it is capped
+        by the API quota left so sites out of budget don't pile up refreshes they can't crawl.
+        """
+        if self.quota.limited:
+            budget = min(budget, int(self.quota.available() // self.crawl_cost))
+        pending = self.pending_recrawls()
+        budget -= pending
+        if budget <= 0:
+            return 0
+        queued = 0
+        # pending refreshes are still stale, select past them
+        for identifier, index in self.select_stale_entities(budget + pending):
+            if queued >= budget:
+                break
+            if self.fetch_queue.push(identifier, priority=index, force=True):
+                with self._pending_recrawls_lock:
+                    self._pending_recrawls.add(identifier)
+                queued += 1
+        return queued
+
+    def pending_recrawls(self) -> int:
+        """Refreshes queued by schedule_recrawl that the fetch stage (of any replica) hasn't popped yet."""
+        with self._pending_recrawls_lock:
+            self._pending_recrawls = {identifier for identifier in self._pending_recrawls if self.fetch_queue.contains(identifier)}
+            return len(self._pending_recrawls)
+
+    async def search_entities(self, query: str, limit: int = 10):
+        """
+        Autocomplete identifiers, best ranked first. Served by the pg_trgm GIN index:
+        queries of 3+ characters match anywhere in the identifier, shorter ones only
+        match as a prefix since they don't contain a full trigram to look up.
+        """
+        # backslash is postgres' default LIKE escape character
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        search_pattern = f"%{escaped}%" if len(query) >= 3 else f"{escaped}%"
+
+        async with AsyncSession(async_engine) as session:
+            # Get top matching results
+            result = await session.execute(
+                select(self.EntityModel)
+                .where(self.EntityModel.identifier.ilike(search_pattern))
+                .order_by(self.EntityModel.index.desc())
+                .limit(limit)
+            )
+            return result.scalars().all()
@@ -1,10 +1,10 @@
 from typing import List
-import requests
 import os
-from sites.types import RequestEntity, Record, EntityInfo,EntityMetadata
+from sites.types import RequestEntity, RecordArray, EntityInfo,EntityMetadata
 from sites import SiteWorker
+from core.quota import QuotaExceeded
 from datetime import datetime
-import time
+from itertools import chain
 
 
 class Github(SiteWorker):
@@ -15,39 +15,31 @@ class Github(SiteWorker):
     metric_name = 'stars'
     primary_color = 'gray'
     secondary_color = 'black'
+    # authenticated REST API: 5,000 requests an hour, kept in sync with the X-RateLimit-* headers
+    quota_capacity = 5000
+    quota_refill_per_second = 5000 / 3600
+    crawl_cost = 2  # one repos page and the user
+    # repos are always fetched fresh for their star counts
+    cache_ttls = {"user": 3600, "starred": 3600}
     
-    def __init__(self):
-        super().__init__()
-        self.headers = {
+    def http_headers(self):
+        return {
             'Authorization': f'token {os.getenv("GITHUB_API_KEY")}',
             'Accept': 'application/vnd.github.v3+json'
         }
 
-    def check_rate_limit(self):
-        """Check remaining rate limit and wait if necessary"""
-        rate_limit_url = "https://api.github.com/rate_limit"
-        response = requests.get(rate_limit_url, headers=self.headers)
-        data = response.json()
-        
-        remaining = data['rate']['remaining']
-        reset_time = datetime.fromtimestamp(data['rate']['reset'])
-        
-        if remaining <= 1:
-            wait_time = (reset_time - datetime.now()).total_seconds()
-            if wait_time > 0:
-                print(f"Rate limit reached. Waiting {wait_time:.0f} seconds...")
-                time.sleep(wait_time + 1)  # Add 1 second buffer
-
     def entity_info(self, entity: RequestEntity) -> EntityInfo:
         repos_url = f"https://api.github.com/users/{entity.identifier}/repos"
-        repos_response = requests.get(repos_url, headers=self.headers)
-        repos = repos_response.json()
-        result =[]
-        for repo in repos:
-            result.append(Record(link=repo['html_url'], description=repo['description'] if repo['description'] else "", created_at=datetime.strptime(repo['created_at'], '%Y-%m-%dT%H:%M:%SZ'), metric=repo['stargazers_count'], metric_type="stars"))
-        user_info_url = f"https://api.github.com/users/{entity.identifier}"
-        user_info_response = requests.get(user_info_url, headers=self.headers)
-        user_info = user_info_response.json()
+        result = RecordArray(metric_type="stars")
+        first_page = self.http.get(repos_url, params={'per_page': 100})
+        first_page.raise_for_status()
+        # the first page links to the last one, the rest are fetched concurrently
+        fetch_page = lambda page: self.http.get_json(repos_url, params={'per_page': 100, 'page': page})
+        pages = chain([first_page.json()], self.fetch_pages(fetch_page, range(2, self.http.last_page(first_page) + 1)))
+        for page in pages:
+            for repo in page:
+                result.append(repo['stargazers_count'], link=repo['html_url'])
+        user_info = self.http.get_json(f"https://api.github.com/users/{entity.identifier}", call_type="user")
         return EntityInfo(
             records=result, 
             metadata=EntityMetadata(
@@ -61,11 +53,11 @@ class Github(SiteWorker):
         # get users that have commented on this user's posts and users that this user has commented on
         related = [] 
         try:
-            self.check_rate_limit()
-            starred_url = f"https://api.github.com/users/{entity.identifier}/starred"
-            starred_response = requests.get(starred_url, headers=self.headers)
-            starred = starred_response.json()
+            # rate limits are tracked from response headers by self.http, no probe call needed
+            starred = self.http.get_json(f"https://api.github.com/users/{entity.identifier}/starred", call_type="starred")
             related.extend([RequestEntity(identifier=user['owner']['login'], type=self.name) for user in starred])
+        except QuotaExceeded:
+            raise
         except Exception as e:
             print(f"Error fetching starred users: {e}")
         return related
\ No newline at end of file
@@ -1,9 +1,8 @@
 
 from sites import SiteWorker
-from huggingface_hub import HfApi
-import requests
-from sites.types import RequestEntity, Record, EntityInfo,EntityMetadata
+from sites.types import RequestEntity, EntityInfo,EntityMetadata
 from typing import List
+from functools import cached_property
 import os
 
 class HuggingFace(SiteWorker):
@@ -14,21 +13,23 @@ class HuggingFace(SiteWorker):
     metric_name = 'downloads'
     primary_color = 'gold'
     secondary_color = 'white'
+    cache_ttls = {"following": 3600}
 
-    def __init__(self):
-        super().__init__()
-        self.client = HfApi(token=os.getenv("HF_API_TOKEN"))
-    
+    @cached_property
+    def client(self):
+        """Hub client, created on first use (huggingface_hub is also slow to import)."""
+        from huggingface_hub import HfApi
+        return HfApi(token=os.getenv("HF_API_TOKEN"))
 
     def entity_info(self, entity: RequestEntity) -> EntityInfo:
         models = self.client.list_models(author=entity.identifier)
-        return EntityInfo(records=[Record(link=model.modelId, description=model.modelId, created_at=model.created_at, metric=model.downloads, metric_type="downloads") for model in models], metadata=EntityMetadata(identifier=entity.identifier, url=f"https://huggingface.co/{entity.identifier}"))
+        return EntityInfo(records=(model.downloads or 0 for model in models), metadata=EntityMetadata(identifier=entity.identifier, url=f"https://huggingface.co/{entity.identifier}"))
     
     def get_related_entities(self, entity: RequestEntity) -> List[RequestEntity]:
         try:
             url = f"https://huggingface.co/api/users/{entity.identifier}/following"
-            response = requests.get(url)
-            return [RequestEntity(identifier=user['user'], type=self.name) for user in response.json()]
+            following = self.http.get_json(url, call_type="following")
+            return [RequestEntity(identifier=user['user'], type=self.name) for user in following]
         except Exception as e:
             print(f"Error getting related entities for {entity.identifier} in {self.name}: {e}")
             return []
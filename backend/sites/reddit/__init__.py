@@ -1,11 +1,13 @@
 
 import os
-import praw 
+from functools import cached_property
+from itertools import chain
 
-from typing import List
+from typing import Iterator, List
 
-from sites.types import RequestEntity, Record, EntityInfo,EntityMetadata
+from sites.types import RequestEntity, EntityInfo,EntityMetadata
 from sites import SiteWorker
+from core.cache import request_key
 from datetime import datetime
 class Reddit(SiteWorker):
     name = "reddit"
@@ -15,35 +17,60 @@ class Reddit(SiteWorker):
     metric_name = 'upvotes'
     primary_color = 'red'
     secondary_color = 'black'
+    # posts of the user's most recent comments, noted by entity_info for get_related_entities
+    related_comments = 10
+    cache_ttls = {"recent_link_ids": 3600}
     
-    def __init__(self):
-        super().__init__()
-        self.reddit_client = praw.Reddit(
+    @cached_property
+    def reddit_client(self):
+        """Read-only PRAW client, created on first use (praw is also slow to import)."""
+        import praw
+        reddit_client = praw.Reddit(
             client_id=os.getenv("REDDIT_CLIENT_ID"),
             client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
             user_agent="impact-index-bot",
         )
-        self.reddit_client.read_only = True
+        reddit_client.read_only = True
+        return reddit_client
 
 
+    def _recent_link_ids_key(self, identifier: str) -> str:
+        return request_key("recent_link_ids", identifier.lower())
+
+    def _comment_scores(self, identifier: str, comments) -> Iterator[int]:
+        """Scores of the comments (newest first), caching the posts of the first few along the way."""
+        link_ids = []
+        for comment in comments:
+            if len(link_ids) < self.related_comments:
+                link_ids.append(comment.link_id)
+                if len(link_ids) == self.related_comments:
+                    self.cache.set(self._recent_link_ids_key(identifier), link_ids, self.cache_ttls["recent_link_ids"])
+            yield comment.score
+        if 0 < len(link_ids) < self.related_comments:
+            self.cache.set(self._recent_link_ids_key(identifier), link_ids, self.cache_ttls["recent_link_ids"])
+
     def entity_info(self, entity: RequestEntity) -> EntityInfo:
         user = self.reddit_client.redditor(entity.identifier)
         comments = user.comments.new(limit=None)
         posts = user.submissions.top(limit=None)
-        comment_records = [Record(link=comment.permalink, description=comment.body, created_at=comment.created_utc, metric=comment.score, metric_type="upvotes") for comment in comments]
-        post_records = [Record(link=post.permalink, description=post.title, created_at=post.created_utc, metric=post.score, metric_type="upvotes") for post in posts]
-        return EntityInfo(records=comment_records + post_records, metadata=EntityMetadata(identifier=user.name, url=f"https://www.reddit.com/user/{user.name}", created_at = datetime.fromtimestamp(user.created_utc)))
+        # prolific accounts have tens of thousands of these, stream the scores instead of building records
+        scores = chain(self._comment_scores(entity.identifier, comments), (post.score for post in posts))
+        return EntityInfo(records=scores, metadata=EntityMetadata(identifier=user.name, url=f"https://www.reddit.com/user/{user.name}", created_at = datetime.fromtimestamp(user.created_utc)))
 
     def get_related_entities(self, entity: RequestEntity) -> List[RequestEntity]:
         # get users that have commented on this user's posts and users that this user has commented on
         entity_set = set()
         related_entities = []
         try:
-            user = self.reddit_client.redditor(entity.identifier)
-            comments = user.comments.new(limit=10)
-            for comment in comments:
-                #get the post that this comment is on 
-                post = comment.submission
+            # the posts this user recently commented on, as read by entity_info
+            link_ids = self.cache.get(self._recent_link_ids_key(entity.identifier))
+            if link_ids is None:
+                user = self.reddit_client.redditor(entity.identifier)
+                link_ids = [comment.link_id for comment in user.comments.new(limit=self.related_comments)]
+            if not link_ids:
+                return related_entities
+            # one batched lookup for all the posts instead of loading each comment's submission
+            for post in self.reddit_client.info(fullnames=link_ids):
                 #get the author of the post
                 post_author = post.author
                 if post_author:
@@ -3,8 +3,9 @@ from enum import Enum
 from pydantic import BaseModel
 import os
 import pathlib
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass
+from array import array
 def _get_supported_sites():
     # Get the directory where this file is located
     current_dir = pathlib.Path(__file__).parent
@@ -27,6 +28,52 @@ class Record(BaseModel):
     metric: int 
     metric_type: str
 
+class RecordArray:
+    """
+    Columnar alternative to a list of Records for large crawls. Metrics live in a compact
+    int64 array; link, description and created_at columns are only allocated once a
+    record actually provides them, so a site that only needs metrics pays 8 bytes per record.
+    """
+
+    def __init__(self, metric_type: str = ""):
+        self.metric_type = metric_type
+        self.metrics = array('q')
+        self.links: Optional[List[Optional[str]]] = None
+        self.descriptions: Optional[List[Optional[str]]] = None
+        self.created_at: Optional[List[Optional[datetime]]] = None
+
+    @staticmethod
+    def _append_to(column, size: int, value):
+        if column is None:
+            if value is None:
+                return None
+            column = [None] * size
+        column.append(value)
+        return column
+
+    def append(self, metric: int, link: str = None, description: str = None, created_at: datetime = None):
+        size = len(self.metrics)
+        self.metrics.append(int(metric))
+        self.links = self._append_to(self.links, size, link)
+        self.descriptions = self._append_to(self.descriptions, size, description)
+        self.created_at = self._append_to(self.created_at, size, created_at)
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.metrics)
+
+    def rows(self) -> Iterator[Tuple[int, Optional[str], Optional[str], Optional[datetime]]]:
+        """(metric, link, description, created_at) per record, missing columns come back as None."""
+        for i, metric in enumerate(self.metrics):
+            yield (
+                metric,
+                self.links[i] if self.links else None,
+                self.descriptions[i] if self.descriptions else None,
+                self.created_at[i] if self.created_at else None,
+            )
+
 @dataclass
 class EntityMetadata:
     url: str = ""
@@ -35,7 +82,7 @@ class EntityMetadata:
 
 @dataclass
 class EntityInfo:
-    records: List[Record]
+    records: Union[RecordArray, Iterable[Union[Record, int]]]  # may be a generator, consumed once by calculate_h_index
     metadata: EntityMetadata
 
     def to_dict(self,drop=[]):
@@ -1,10 +1,13 @@
-from sites.types import RequestEntity, Record, EntityInfo,EntityMetadata
+from sites.types import RequestEntity, RecordArray, EntityInfo,EntityMetadata
 from sites import SiteWorker
-from typing import List
-from googleapiclient.discovery import build
+from core.quota import QuotaExceeded
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from functools import cached_property
+from threading import Lock, local
+import httplib2
 import os
 from datetime import datetime
-import time
 class Youtube(SiteWorker):
     name = "youtube"
     description = "Youtube channel H-index based on views"
@@ -13,93 +16,205 @@ class Youtube(SiteWorker):
     metric_name = "Million views"
     primary_color = "red"
     secondary_color = "gray"
+    supports_incremental = True
+    # Data API v3 quota: 10,000 units a day, a search costs 100 units and list calls 1
+    quota_capacity = float(os.getenv("YOUTUBE_DAILY_QUOTA", 10000))
+    quota_refill_per_second = quota_capacity / 86400
+    quota_costs = {"search.list": 100, "channels.list": 1, "playlistItems.list": 1, "videos.list": 1}
+    # searches are the expensive calls and the same topics come up for many channels,
+    # uploads and view counts are always fetched fresh
+    cache_ttls = {"search.list": 86400, "channels.list": 3600}
+    crawl_cost = 3  # channel, one uploads page, one stats batch
+    expand_cost = 102  # search and one batched channel lookup, the channel itself is usually cached
+    # channels fetched by entity_info are kept until get_related_entities of the same crawl uses them
+    channel_cache_size = int(os.getenv("YOUTUBE_CHANNEL_CACHE_SIZE", 1024))
+    CHANNEL_PARTS = 'id,contentDetails,snippet,topicDetails'
     def __init__(self):
         super().__init__()
-        self.client = build('youtube', 'v3', developerKey=os.getenv('YOUTUBE_API_KEY'))
+        self._channel_cache = OrderedDict()
+        self._channel_cache_lock = Lock()
+        self._thread_http = local()
+
+
+    @cached_property
+    def client(self):
+        """Data API client, built on first use (googleapiclient is also slow to import)."""
+        from googleapiclient.discovery import build
+        return build('youtube', 'v3', developerKey=os.getenv('YOUTUBE_API_KEY'))
+
+    def _execute(self, call_type: str, request):
+        """
+        Run a googleapiclient request once its quota cost is reserved, or serve it from the response cache.
+        httplib2 connections aren't thread safe, so crawl and pagination threads each execute on their own.
+        """
+        def fetch():
+            self.reserve(call_type)
+            if not hasattr(self._thread_http, "http"):
+                self._thread_http.http = httplib2.Http(timeout=self.http.timeout)
+            return request.execute(http=self._thread_http.http)
+        return self.cached(call_type, request.uri, fetch)
+
+    def _cache_channel(self, handle: str, channel):
+        with self._channel_cache_lock:
+            self._channel_cache[handle.lower()] = channel
+            self._channel_cache.move_to_end(handle.lower())
+            while len(self._channel_cache) > self.channel_cache_size:
+                self._channel_cache.popitem(last=False)
+
+    def _channel(self, handle: str, consume: bool = False):
+        """
+        Channel resource by handle, from the crawl cache when entity_info or a related channel lookup
+        already fetched it. `consume` drops it from the cache, for the last step of a crawl.
+        """
+        with self._channel_cache_lock:
+            channel = self._channel_cache.pop(handle.lower(), None) if consume else self._channel_cache.get(handle.lower())
+        if channel is not None:
+            return channel
+        channel_response = self._execute("channels.list", self.client.channels().list(
+            forHandle=handle,
+            part=self.CHANNEL_PARTS
+        ))
+        if not channel_response['items']:
+            raise Exception("Channel not found")
+        channel = channel_response['items'][0]
+        if not consume:
+            self._cache_channel(handle, channel)
+        return channel
+
+    def _channels_by_id(self, channel_ids: List[str]) -> List[dict]:
+        """Channel resources for up to 50 ids in a single call, cached by handle for their own crawl."""
+        if not channel_ids:
+            return []
+        channel_response = self._execute("channels.list", self.client.channels().list(
+            id=','.join(channel_ids[:50]),
+            part=self.CHANNEL_PARTS
+        ))
+        channels = channel_response.get('items', [])
+        for channel in channels:
+            custom_url = channel['snippet'].get('customUrl')
+            if custom_url:
+                self._cache_channel(custom_url.lstrip('@'), channel)
+        return channels
+
+    def _upload_pages(self, channel, since: Optional[datetime] = None) -> Iterator[List[Tuple[str, datetime]]]:
+        """Pages of (video id, published at) of a channel's uploads, newest first, stopping at `since`."""
+        uploads_playlist_id = channel['contentDetails']['relatedPlaylists']['uploads']
+        next_page_token = None
+        while True:
+            playlist_response = self._execute("playlistItems.list", self.client.playlistItems().list(
+                playlistId=uploads_playlist_id,
+                part='contentDetails',
+                maxResults=50, #max results per page
+                pageToken=next_page_token
+            ))
+
+            uploads = []
+            for item in playlist_response['items']:
+                published_at = item['contentDetails'].get('videoPublishedAt')
+                published_at = datetime.fromisoformat(published_at) if published_at else None
+                if since and published_at and published_at <= since:
+                    # the uploads playlist is ordered newest first
+                    if uploads:
+                        yield uploads
+                    return
+                uploads.append((item['contentDetails']['videoId'], published_at))
+            if uploads:
+                yield uploads
+
+            next_page_token = playlist_response.get('nextPageToken')
+            if not next_page_token:
+                return
+
+    def _video_views_batch(self, video_ids: List[str]) -> Dict[str, int]:
+        """Views in millions by video id, for at most 50 ids."""
+        video_response = self._execute("videos.list", self.client.videos().list(
+            id=','.join(video_ids),
+            part='statistics'
+        ))
+        return {video['id']: int(int(video['statistics'].get('viewCount', 0))/1000000) for video in video_response['items']}
+
+    def _video_views(self, video_ids: List[str]) -> Dict[str, int]:
+        """Views in millions by video id."""
+        views = {}
+        # YouTube API allows max 50 IDs per request
+        for batch in self.fetch_pages(self._video_views_batch, (video_ids[i:i+50] for i in range(0, len(video_ids), 50))):
+            views.update(batch)
+        return views
+
+    @staticmethod
+    def _video_link(video_id: str) -> str:
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    def _page_views(self, uploads: List[Tuple[str, datetime]]):
+        return uploads, self._video_views_batch([video_id for video_id, _ in uploads])
+
+    def _records(self, upload_pages: Iterator[List[Tuple[str, datetime]]]) -> RecordArray:
+        """
+        Records of the uploads, the stats of each page of uploads (50 videos, one videos.list batch)
+        are fetched concurrently while the walk of the playlist goes on.
+        """
+        records = RecordArray(metric_type="views(thousands)")
+        for uploads, views in self.fetch_pages(self._page_views, upload_pages):
+            for video_id, published_at in uploads:
+                if video_id in views:
+                    records.append(views[video_id], link=self._video_link(video_id), created_at=published_at)
+        return records
 
-    
     def entity_info(self, entity: RequestEntity) -> EntityInfo:
-        records = []
         metadata = EntityMetadata(identifier=entity.identifier, url=f"https://www.youtube.com/@{entity.identifier}")
         try:
-            channel_response = self.client.channels().list(
-                forHandle=entity.identifier,
-                part='id,contentDetails,snippet'
-            ).execute()
-        
-            if not channel_response['items']:
-                raise Exception("Channel not found")
-            
-            channel_id = channel_response['items'][0]['id']
-            metadata.created_at  = datetime.fromisoformat(channel_response['items'][0]['snippet']['publishedAt'])
-            
-            uploads_playlist_id = channel_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
-            video_ids = []
-            next_page_token = None
-            while True:
-                playlist_response = self.client.playlistItems().list(
-                    playlistId=uploads_playlist_id,
-                    part='contentDetails',
-                    maxResults=50, #max results per page
-                    pageToken=next_page_token
-                ).execute()
-
-                for item in playlist_response['items']:
-                    video_ids.append(item['contentDetails']['videoId'])
-
-                next_page_token = playlist_response.get('nextPageToken')
-                if not next_page_token:
-                    break
-            for i in range(0, len(video_ids), 50):  # YouTube API allows max 50 IDs per request
-                batch_ids = video_ids[i:i+50]
-                video_response = self.client.videos().list(
-                    id=','.join(batch_ids),
-                    part='snippet,statistics'
-                ).execute()
-                for video in video_response['items']:
-                    records.append(Record(link=f"https://www.youtube.com/watch?v={video['id']}", description=video['snippet']['title'], created_at=video['snippet']['publishedAt'], metric=int(int(video['statistics'].get('viewCount', 0))/1000000), metric_type="views(thousands)"))
+            channel = self._channel(entity.identifier)
+            metadata.created_at  = datetime.fromisoformat(channel['snippet']['publishedAt'])
+            records = self._records(self._upload_pages(channel))
+        except QuotaExceeded:
+            raise
         except Exception as e:
             print(f"Error fetching channel details: {e}")
             raise Exception(f"Error fetching channel details: {e}")
-            return None 
         return EntityInfo(records=records, metadata=metadata)
 
+    def entity_updates(self, entity: RequestEntity, since: Optional[datetime], tracked: List[str]) -> Tuple[EntityInfo, Dict[str, int]]:
+        """Only uploads newer than `since` plus a stats re-check of the tracked videos, instead of the whole channel."""
+        metadata = EntityMetadata(identifier=entity.identifier, url=f"https://www.youtube.com/@{entity.identifier}")
+        try:
+            channel = self._channel(entity.identifier)
+            metadata.created_at  = datetime.fromisoformat(channel['snippet']['publishedAt'])
+            records = self._records(self._upload_pages(channel, since=since))
+            tracked_ids = [link.split("v=")[-1] for link in tracked]
+            rechecked = {self._video_link(video_id): views for video_id, views in self._video_views(tracked_ids).items()}
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Error fetching channel updates: {e}")
+            raise Exception(f"Error fetching channel updates: {e}")
+        return EntityInfo(records=records, metadata=metadata), rechecked
+
     def get_related_entities(self, entity: RequestEntity) -> List[RequestEntity]:
         # using topic categories to find related channels
         entities = [] 
         try:
-            channel_response = self.client.channels().list(
-                forHandle=entity.identifier,
-                part='topicDetails'
-            ).execute()
-        
-            if not channel_response['items']:
-                return entities
-            
-            topics = channel_response['items'][0]['topicDetails']['topicCategories']
+            channel = self._channel(entity.identifier, consume=True)
+            topics = channel.get('topicDetails', {}).get('topicCategories', [])
             if len(topics) > 0:
                 topic = topics[0]
                 # search for channels by topic 
-                search_response = self.client.search().list(
+                search_response = self._execute("search.list", self.client.search().list(
                     q=topic,
                     part='id,snippet',
                     type='channel',
                     maxResults=10
-                ).execute()
+                ))
 
                 channel_ids = [item['id']['channelId'] for item in search_response['items']]
-                for channel_id in channel_ids:
-                    time.sleep(1) # for rate limiting
-                    channel_response = self.client.channels().list(
-                        id=channel_id,
-                        part='id,snippet,contentDetails'
-                    ).execute()
-                    if channel_response['items']:
-                        custom_url = channel_response['items'][0]['snippet'].get('customUrl')
-                        if custom_url:
-                            handle = custom_url.lstrip('@')
-                            entities.append(RequestEntity(type=self.name, identifier=handle))
+                # one batched lookup for every result instead of a call per channel
+                for related_channel in self._channels_by_id(channel_ids):
+                    custom_url = related_channel['snippet'].get('customUrl')
+                    if custom_url:
+                        handle = custom_url.lstrip('@')
+                        entities.append(RequestEntity(type=self.name, identifier=handle))
 
+        except QuotaExceeded:
+            raise
         except Exception as e:
             print(f"Error fetching channel details: {e}")
         return entities
@@ -1,13 +1,17 @@
+import asyncio
+import itertools
+from datetime import datetime
 import pytest
 import os
 import sys
-from typing import List
+from typing import List, Type
 from utils import load_site_workers
 # Add the backend directory to Python path for imports
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(backend_dir)
 
 from sites import SiteWorker
+from sites.types import RequestEntity, EntityInfo, EntityMetadata
 
 
 # Create a mock SiteWorker for testing
@@ -22,10 +26,10 @@ class ValidMockSiteWorker(SiteWorker):
     def __init__(self):
         super().__init__()
     
-    def entity_info(self, entity): # -> EntityInfo: #TODO: fix this
-        return []
+    def entity_info(self, entity) -> EntityInfo:
+        return EntityInfo(records=[5, 4, 3, 2, 1], metadata=EntityMetadata(identifier=entity.identifier, url=f"https://example.com/{entity.identifier}"))
 
-    def get_related_entities(self, entity): # -> List[RequestEntity]: #TODO: fix this
+    def get_related_entities(self, entity) -> List[RequestEntity]:
         return []
 
 # Create an invalid worker (doesn't inherit from SiteWorker)
@@ -44,3 +48,68 @@ def invalid_worker():
 def site_workers():
     """Initialize site_workers once for all tests."""
     return load_site_workers()
+
+
+_worker_ids = itertools.count()
+
+
+@pytest.fixture
+def make_site_worker():
+    """Build site workers with a table name of their own, each entity table can only be declared once per process."""
+    def _make(base: Type[SiteWorker] = ValidMockSiteWorker) -> SiteWorker:
+        class TestSiteWorker(base):
+            name = f"test_site_{next(_worker_ids)}"
+        return TestSiteWorker()
+    return _make
+
+
+@pytest.fixture
+def make_db_site_worker(make_site_worker):
+    """Site workers with their table created, tests using them are skipped when DB_URL has no database to reach."""
+    from db.definitions import engine
+    try:
+        with engine.connect():
+            pass
+    except Exception:
+        pytest.skip("no database reachable at DB_URL")
+    workers = []
+
+    def _make() -> SiteWorker:
+        worker = make_site_worker()
+        worker.ensure_schema()
+        workers.append(worker)
+        return worker
+    yield _make
+    for worker in workers:
+        worker.EntityModel.__table__.drop(engine, checkfirst=True)
+
+
+@pytest.fixture
+def run_async():
+    """Run a coroutine on a fresh event loop, the async engine's connections can't outlive it."""
+    from db.definitions import async_engine
+
+    def _run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return _run
+
+
+@pytest.fixture
+def seed_entities():
+    """Write {identifier: index} rows for a worker through write_entities, like a crawl flush."""
+    from sqlalchemy.orm import Session
+    from db.definitions import engine
+
+    def _seed(worker: SiteWorker, indices):
+        rows = [{
+            "identifier": identifier, "index": index, "total_metrics": index, "last_updated_at": datetime.now(),
+            "url": f"https://example.com/{identifier}", "created_at": None, "metric_state": None,
+        } for identifier, index in indices.items()]
+        with Session(engine) as session:
+            worker.write_entities(rows, session)
+    return _seed
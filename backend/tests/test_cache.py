@@ -0,0 +1,99 @@
+import time
+
+import fakeredis
+import pytest
+
+from core.cache import MemoryCache, RedisCache, request_key
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        return MemoryCache(max_entries=3)
+    return RedisCache(fakeredis.FakeRedis(decode_responses=True), "test")
+
+
+class TestResponseCache:
+
+    def test_get_or_fetch(self, cache):
+        """Test that a cached call is only made once while its entry is fresh."""
+        calls = []
+        fetch = lambda: calls.append(1) or {"items": [1, 2]}
+        assert cache.get_or_fetch("k", fetch, ttl=60) == {"items": [1, 2]}
+        assert cache.get_or_fetch("k", fetch, ttl=60) == {"items": [1, 2]}
+        assert len(calls) == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hit_ratio"] == 0.5
+
+    def test_expires(self, cache):
+        """Test that entries are gone after their TTL."""
+        cache.set("k", [1], ttl=0.05)
+        assert cache.get("k") == [1]
+        time.sleep(0.1)
+        assert cache.get("k") is None
+
+    def test_delete(self, cache):
+        """Test that deleted entries are fetched again."""
+        cache.set("k", "old", ttl=60)
+        cache.delete("k")
+        assert cache.get_or_fetch("k", lambda: "new", ttl=60) == "new"
+
+    def test_none_not_cached(self, cache):
+        """Test that failed lookups returning None are fetched again."""
+        cache.get_or_fetch("k", lambda: None, ttl=60)
+        assert cache.get_or_fetch("k", lambda: "found", ttl=60) == "found"
+
+
+class TestMemoryCache:
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted past max_entries."""
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        cache.get("a")
+        cache.set("c", 3, ttl=60)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.size() == 2
+
+
+class TestRedisCache:
+
+    def test_size_counts_live_entries_without_scanning(self, monkeypatch):
+        """Test that size follows sets, deletes and expiry from the expiry index, not a keyspace scan."""
+        cache = RedisCache(fakeredis.FakeRedis(decode_responses=True), "test")
+        monkeypatch.setattr(cache.client, "scan_iter", None)
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        cache.set("a", 3, ttl=60)
+        cache.set("short", 4, ttl=0.05)
+        assert cache.size() == 3
+
+        cache.delete("b")
+        time.sleep(0.1)
+        assert cache.size() == 1
+
+    def test_set_bounds_the_cache(self):
+        """Test that sets trim expired entries and evict the ones closest to expiry beyond max_entries."""
+        client = fakeredis.FakeRedis(decode_responses=True)
+        cache = RedisCache(client, "test", max_entries=3)
+        cache.set("short", 0, ttl=0.05)
+        time.sleep(0.1)
+        for i in range(5):
+            cache.set(f"key_{i}", i, ttl=60 + i)
+
+        assert client.zrange(cache.expiries_key, 0, -1) == ["key_2", "key_3", "key_4"]
+        assert cache.get("key_0") is None and cache.get("key_4") == 4
+        assert 0 < client.ttl(cache.expiries_key) <= 65
+
+
+class TestRequestKey:
+
+    def test_stable_and_hashed(self):
+        """Test that equal requests share a key and that URLs (with API keys) aren't stored in clear."""
+        key = request_key("channels.list", "https://example.com/?key=secret", {"b": 1, "a": 2})
+        assert key == request_key("channels.list", "https://example.com/?key=secret", {"a": 2, "b": 1})
+        assert key.startswith("channels.list:")
+        assert "secret" not in key
@@ -0,0 +1,132 @@
+from datetime import datetime
+
+from sites.types import RequestEntity
+
+
+class TestScheduleRecrawl:
+
+    def test_recrawls_queued_while_discovery_is_pending(self, make_site_worker, monkeypatch):
+        """Test that discovered entities waiting in the fetch queue don't use up the recrawl budget."""
+        worker = make_site_worker()
+        worker.queue_entities([RequestEntity(type=worker.name, identifier=f"discovered_{i}") for i in range(50)])
+        monkeypatch.setattr(worker, "select_stale_entities", lambda limit: [(f"stale_{i}", i) for i in range(limit)])
+
+        assert worker.schedule_recrawl(8) == 8
+        assert worker.fetch_queue.size() == 58
+
+    def test_pending_recrawls_count_against_the_budget(self, make_site_worker, monkeypatch):
+        """Test that refreshes are only topped up as the fetch stage takes the earlier ones."""
+        worker = make_site_worker()
+        monkeypatch.setattr(worker, "select_stale_entities", lambda limit: [(f"stale_{i}", i) for i in range(limit)])
+
+        assert worker.schedule_recrawl(8) == 8
+        assert worker.schedule_recrawl(8) == 0
+        for _ in range(3):
+            worker.fetch_queue.pop(timeout=0.1)
+        assert worker.pending_recrawls() == 5
+        assert worker.schedule_recrawl(8) == 3
+
+
+class TestFlushWrites:
+
+    def crawl(self, worker, count):
+        for i in range(count):
+            worker.run(RequestEntity(type=worker.name, identifier=f"entity_{i}"), buffered=True)
+
+    def test_failed_flush_keeps_rows_for_the_next_one(self, make_site_worker, monkeypatch):
+        """Test that rows survive a failing flush and entities only count as crawled once written."""
+        worker = make_site_worker()
+        written = []
+
+        def failing_write(rows, session):
+            raise ConnectionError("database is down")
+        monkeypatch.setattr(worker, "write_entities", failing_write)
+        self.crawl(worker, 3)
+        worker.flush_writes()
+
+        assert len(worker._write_buffer) == 3
+        assert worker.fetch_queue.seen_count() == 0
+        assert worker.unwritten.size() == 3
+
+        monkeypatch.setattr(worker, "write_entities", lambda rows, session: written.extend(rows))
+        worker.flush_writes()
+
+        assert [row["identifier"] for row in written] == ["entity_0", "entity_1", "entity_2"]
+        assert worker._write_buffer == []
+        assert worker.fetch_queue.seen_count() == 3
+        assert worker.unwritten.size() == 0
+
+    def test_rows_beyond_the_buffer_limit_are_requeued(self, make_site_worker, monkeypatch):
+        """Test that a long outage requeues the oldest rows for a fresh crawl rather than growing the buffer."""
+        worker = make_site_worker()
+        worker.write_buffer_max_rows = 2
+
+        def failing_write(rows, session):
+            raise ConnectionError("database is down")
+        monkeypatch.setattr(worker, "write_entities", failing_write)
+        self.crawl(worker, 3)
+        worker.flush_writes()
+
+        assert [row["identifier"] for row in worker._write_buffer] == ["entity_1", "entity_2"]
+        assert worker.fetch_queue.contains("entity_0")
+
+    def test_unwritten_entities_of_dead_replicas_are_requeued(self, make_site_worker, monkeypatch):
+        """Test that entities crawled by a replica that never flushed them are crawled again."""
+        worker = make_site_worker()
+        monkeypatch.setattr(worker.unwritten, "recover", lambda: [("entity_0", 3), ("entity_1", 1)])
+
+        assert worker.requeue_unwritten() == 2
+        assert worker.fetch_queue.contains("entity_0") and worker.fetch_queue.contains("entity_1")
+        assert worker.requeue_unwritten(only_if_due=True) == 0
+
+
+class TestIncrementalCrawl:
+
+    def test_sites_without_entity_updates_crawl_fully(self, make_site_worker, monkeypatch):
+        """Test that the default entity_updates falls back to a full crawl instead of failing."""
+        worker = make_site_worker()
+        worker.supports_incremental = True
+        state = {"full_refresh_at": datetime.now().isoformat(), "watermark": None, "tracked": {}}
+        monkeypatch.setattr(worker, "load_metric_state", lambda identifier: (state, 15))
+
+        entity_info, index, total, _ = worker.crawl(RequestEntity(type=worker.name, identifier="entity"))
+        assert entity_info.metadata.identifier == "entity"
+        assert (index, total) == (3, 15)
+
+
+class TestCrawlEvents:
+
+    def record(self, worker):
+        published = []
+        worker.emit = lambda type, identifier, **data: published.append(type)
+        return published
+
+    def test_related_queued_precedes_completed(self, make_site_worker, monkeypatch):
+        """Test that per-entity streams, which end on the terminal event, see every event of the crawl."""
+        worker = make_site_worker()
+        monkeypatch.setattr(worker, "write_entities", lambda rows, session: None)
+        published = self.record(worker)
+        worker.run(RequestEntity(type=worker.name, identifier="entity"))
+
+        assert published == ["started", "fetched", "indexed", "related_queued", "completed"]
+        assert worker.expand_queue.size() == 1
+
+    def test_buffered_entities_expand_once_written(self, make_site_worker, monkeypatch):
+        """Test that the crawl pool queues no expansion for a row a flush could still lose."""
+        worker = make_site_worker()
+        published = self.record(worker)
+
+        def failing_write(rows, session):
+            raise ConnectionError("database is down")
+        monkeypatch.setattr(worker, "write_entities", failing_write)
+        worker.run(RequestEntity(type=worker.name, identifier="entity"), buffered=True)
+        worker.flush_writes()
+
+        assert published == ["started", "fetched", "indexed", "buffered"]
+        assert worker.expand_queue.size() == 0
+
+        monkeypatch.setattr(worker, "write_entities", lambda rows, session: None)
+        worker.flush_writes()
+
+        assert published[4:] == ["related_queued", "completed"]
+        assert worker.expand_queue.size() == 1
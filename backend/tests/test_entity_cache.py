@@ -0,0 +1,31 @@
+import json
+from types import SimpleNamespace
+
+import main
+from core.cache import MemoryCache
+
+
+class TestEntityCacheInvalidation:
+
+    def test_written_entity_is_evicted(self, make_db_site_worker, seed_entities, run_async, monkeypatch):
+        """Test that a write evicts the entity's cached response, so the next read serves the new row."""
+        worker = make_db_site_worker()
+        # served under its own name, like the real sites, the handler only reads site.value
+        site = SimpleNamespace(value=worker.name)
+        monkeypatch.setitem(main.state, 'site_workers', {worker.name: worker})
+        monkeypatch.setitem(main.state, 'entity_cache', MemoryCache())
+        worker.add_write_listener(main.invalidate_entities)
+        seed_entities(worker, {"bob": 3, "alice": 5})
+
+        def get_index(identifier):
+            response = run_async(main.get_entity(site, identifier))
+            return json.loads(response.body)["response"]["entity"]["index"]
+
+        assert (get_index("bob"), get_index("alice")) == (3, 5)
+        assert main.state['entity_cache'].get(main.entity_cache_key(worker.name, "bob")) is not None
+
+        seed_entities(worker, {"bob": 8})
+
+        assert main.state['entity_cache'].get(main.entity_cache_key(worker.name, "bob")) is None
+        assert main.state['entity_cache'].get(main.entity_cache_key(worker.name, "alice")) is not None
+        assert get_index("bob") == 8
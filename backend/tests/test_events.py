@@ -0,0 +1,66 @@
+import asyncio
+from threading import Thread
+
+from core.events import EventBus
+
+
+class TestEventBus:
+
+    def test_delivers_events_from_crawl_threads(self):
+        """Test that events published on other threads reach subscribers on the event loop, in order."""
+        bus = EventBus()
+
+        async def listen():
+            subscription = bus.subscribe("github")
+            crawl = Thread(target=lambda: [bus.publish("github", "bob", kind) for kind in ("started", "indexed", "completed")])
+            crawl.start()
+            events = [await subscription.get(timeout=1) for _ in range(3)]
+            crawl.join()
+            return [event["type"] for event in events]
+
+        assert asyncio.run(listen()) == ["started", "indexed", "completed"]
+
+    def test_filters_by_site_and_identifier(self):
+        """Test that per-entity subscribers only see their entity's events."""
+        bus = EventBus()
+
+        async def listen():
+            entity = bus.subscribe("github", "bob")
+            site = bus.subscribe("github")
+            bus.publish("github", "alice", "started")
+            bus.publish("reddit", "bob", "started")
+            bus.publish("github", "bob", "indexed", index=12)
+            await asyncio.sleep(0)
+            return await entity.get(timeout=1), await entity.get(timeout=0.05), site.queue.qsize()
+
+        event, nothing_else, site_events = asyncio.run(listen())
+        assert event["identifier"] == "bob" and event["index"] == 12
+        assert nothing_else is None
+        assert site_events == 2
+
+    def test_latest_event(self):
+        """Test that late subscribers can catch up with an entity's latest event."""
+        bus = EventBus(max_latest=2)
+        bus.publish("github", "bob", "started")
+        bus.publish("github", "bob", "completed")
+        assert bus.latest("github", "bob")["type"] == "completed"
+        bus.publish("github", "a", "started")
+        bus.publish("github", "b", "started")
+        assert bus.latest("github", "bob") is None
+
+    def test_slow_subscribers_drop_events(self):
+        """Test that a full subscriber queue drops events instead of blocking publishers."""
+        bus = EventBus()
+
+        async def listen():
+            subscription = bus.subscribe("github", max_queued=2)
+            for i in range(5):
+                bus.publish("github", str(i), "started")
+            await asyncio.sleep(0.01)
+            bus.unsubscribe(subscription)
+            return subscription
+
+        subscription = asyncio.run(listen())
+        assert subscription.queue.qsize() == 2
+        assert subscription.dropped == 3
+        assert bus.subscriber_count() == 0
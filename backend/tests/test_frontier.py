@@ -0,0 +1,112 @@
+import fakeredis
+import pytest
+
+from core.frontier import MemoryFrontier, RedisFrontier
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_frontier(request):
+    """Build frontiers of either backend, redis ones share a single fake server like replicas would."""
+    server = fakeredis.FakeServer()
+
+    def _make(dedupe=True, max_size=100):
+        if request.param == "memory":
+            return MemoryFrontier(dedupe=dedupe, max_size=max_size)
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        return RedisFrontier(client, "mock", "fetch", dedupe=dedupe, max_size=max_size)
+    return _make
+
+
+class TestFrontier:
+
+    def test_pops_highest_priority_first(self, make_frontier):
+        """Test that entities come out in priority order."""
+        frontier = make_frontier()
+        frontier.push("low", priority=1)
+        frontier.push("high", priority=50)
+        frontier.push("mid", priority=10)
+
+        assert [frontier.pop(timeout=0.1)[0] for _ in range(3)] == ["high", "mid", "low"]
+        assert frontier.pop(timeout=0.1) is None
+
+    def test_deduplicates_crawled_entities(self, make_frontier):
+        """Test that an entity is only queued once, even after it has been popped or crawled elsewhere."""
+        frontier = make_frontier()
+        assert frontier.push("a")
+        assert not frontier.push("a")
+        frontier.pop(timeout=0.1)
+        assert not frontier.push("a")
+
+        frontier.mark_seen("b")
+        assert not frontier.push("b")
+        assert frontier.push("b", force=True)
+        assert frontier.seen_count() == 2
+
+    def test_without_dedupe_and_max_size(self, make_frontier):
+        """Test that non-deduplicating frontiers accept repeats and every frontier respects its max size."""
+        frontier = make_frontier(dedupe=False, max_size=2)
+        assert frontier.push("a")
+        frontier.pop(timeout=0.1)
+        assert frontier.push("a")
+        assert frontier.push("b")
+        assert not frontier.push("c")
+        assert frontier.size() == 2
+
+    def test_contains_queued_entities(self, make_frontier):
+        """Test that contains reports queued identifiers only, not popped or merely seen ones."""
+        frontier = make_frontier()
+        frontier.push("a")
+        frontier.mark_seen("b")
+        assert frontier.contains("a")
+        assert not frontier.contains("b")
+        frontier.pop(timeout=0.1)
+        assert not frontier.contains("a")
+
+    @pytest.mark.parametrize("dedupe,force", [(True, False), (True, True), (False, False)])
+    def test_push_many_matches_single_pushes(self, make_frontier, dedupe, force):
+        """Test that a batch push queues, deduplicates and fills up exactly like pushing one by one."""
+        batch = ["a", "b", "a", "queued", "seen", "c", "d", "e"]
+        reference, frontier = MemoryFrontier(dedupe=dedupe, max_size=5), make_frontier(dedupe=dedupe, max_size=5)
+        for each in (reference, frontier):
+            each.push("queued")
+            each.mark_seen("seen")
+
+        assert frontier.push_many(batch, priority=2, force=force) == \
+            [reference.push(identifier, priority=2, force=force) for identifier in batch]
+        assert (frontier.size(), frontier.seen_count()) == (reference.size(), reference.seen_count())
+        # equal priorities come out in a backend specific order
+        assert {frontier.pop(timeout=0.1) for _ in range(5)} == {reference.pop(timeout=0.1) for _ in range(5)}
+
+
+def test_redis_frontier_is_shared_between_replicas():
+    """Test that two replicas pointed at the same redis share queue and seen-set."""
+    server = fakeredis.FakeServer()
+    replica_a = RedisFrontier(fakeredis.FakeRedis(server=server, decode_responses=True), "mock", "fetch")
+    replica_b = RedisFrontier(fakeredis.FakeRedis(server=server, decode_responses=True), "mock", "fetch")
+
+    assert replica_a.push("a", priority=3)
+    assert not replica_b.push("a")
+    assert replica_b.pop(timeout=0.1) == ("a", 3.0)
+
+
+def test_redis_push_many_round_trips(monkeypatch):
+    """Test that a batch push costs the same few round trips whatever its size."""
+    frontier = RedisFrontier(fakeredis.FakeRedis(decode_responses=True), "mock", "fetch")
+    commands = []
+    execute_command = frontier.client.execute_command
+    monkeypatch.setattr(frontier.client, "execute_command", lambda *args, **kwargs: commands.append(args[0]) or execute_command(*args, **kwargs))
+    executes = []
+    pipeline = frontier.client.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        created = pipeline(*args, **kwargs)
+        execute = created.execute
+        created.execute = lambda *a, **k: executes.append(1) or execute(*a, **k)
+        return created
+    monkeypatch.setattr(frontier.client, "pipeline", counting_pipeline)
+
+    assert all(frontier.push_many([f"entity_{i}" for i in range(1000)], force=True))
+    assert len(commands) + len(executes) == 2
+    commands.clear(), executes.clear()
+    assert not any(frontier.push_many([f"entity_{i}" for i in range(1000)]))
+    assert len(commands) + len(executes) == 2
@@ -0,0 +1,65 @@
+import random
+import tracemalloc
+from array import array
+from datetime import datetime, timedelta
+
+from core.hindex import h_index, build_metric_state, apply_metric_updates
+from benchmarks.stats import sorted_h_index
+
+
+class TestHIndex:
+
+    def test_matches_sorted_implementation(self):
+        """Test that the streaming h-index and total match sorting the full list."""
+        for _ in range(500):
+            metrics = [random.randint(0, random.choice([3, 50, 1000])) for _ in range(random.randint(0, 300))]
+            assert h_index(metrics) == sorted_h_index(metrics)
+
+    def test_consumes_generators(self):
+        """Test that generators, arrays and edge cases give the same result as sorting."""
+        metrics = [random.randint(0, 100) for _ in range(100000)]
+        assert h_index(metric for metric in metrics) == sorted_h_index(metrics)
+        assert h_index(array('q', metrics)) == sorted_h_index(metrics)
+        assert h_index([]) == (0, 0)
+        assert h_index([0, 0]) == (0, 0)
+        assert h_index([10 ** 9] * 3) == (3, 3 * 10 ** 9)
+
+    def test_chunk_boundaries(self):
+        """Test that h carried from chunk to chunk gives the same result whatever the chunk size."""
+        for _ in range(200):
+            metrics = [random.randint(0, random.choice([3, 50, 1000])) for _ in range(random.randint(0, 300))]
+            for chunk_size in (1, 7, 64):
+                assert h_index(iter(metrics), chunk_size=chunk_size) == sorted_h_index(metrics)
+        ascending = list(range(1000))
+        assert h_index(ascending, chunk_size=10) == sorted_h_index(ascending)
+
+    def test_memory_bounded_by_h_and_chunk(self):
+        """Test that a long stream with a small h isn't held in memory, unlike sorting it."""
+        tracemalloc.start()
+        try:
+            h, _ = h_index(i % 200 for i in range(1_000_000))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert h == 199
+        assert peak < 2 * 1024 * 1024  # a list of the metrics alone would be 8MB
+
+    def test_incremental_updates_match_full_recompute(self):
+        """Test that folding new items and re-checked metrics into the state gives the full h-index."""
+        now = datetime(2024, 1, 1)
+        items = {f"item{i}": (random.randint(0, 60), now - timedelta(days=i)) for i in range(300)}
+        h, total = h_index(metric for metric, _ in items.values())
+        state = build_metric_state(((key, metric, created_at) for key, (metric, created_at) in items.items()), h, margin=20)
+        assert state["watermark"] == now.isoformat()
+        assert len(state["tracked"]) == h + 20
+
+        # tracked items gain a little, and new items are published after the watermark
+        rechecked = {key: metric + random.randint(0, 5) for key, metric in state["tracked"].items()}
+        new_rows = [(f"new{i}", random.randint(0, 80), now + timedelta(days=i + 1)) for i in range(30)]
+        h, total, state = apply_metric_updates(state, total, new_rows, rechecked, margin=20)
+
+        current = {key: metric for key, (metric, _) in items.items()}
+        current.update(rechecked)
+        current.update({key: metric for key, metric, _ in new_rows})
+        assert (h, total) == sorted_h_index(current.values())
+        assert state["watermark"] == (now + timedelta(days=30)).isoformat()
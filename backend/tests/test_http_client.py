@@ -0,0 +1,106 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from core.cache import MemoryCache
+from core.http_client import HttpClient
+from core.quota import QuotaExceeded, QuotaManager
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Local stand-in for a site API: flaky, paginated and rate limited endpoints."""
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        StubHandler.hits[path] = StubHandler.hits.get(path, 0) + 1
+        if path == "/flaky" and StubHandler.hits[path] < 3:
+            self._send(503, {"error": "try again"})
+        elif path == "/flaky":
+            self._send(200, {"ok": True})
+        elif path == "/pages":
+            page = int(self.path.split("page=")[-1]) if "page=" in self.path else 1
+            base = f'http://{self.headers["Host"]}/pages'
+            headers = {"Link": f'<{base}?page={page + 1}>; rel="next", <{base}?page=3>; rel="last"'} if page < 3 else {}
+            self._send(200, [page * 10 + i for i in range(2)], headers)
+        elif path == "/limited":
+            self._send(200, [], {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 3600)})
+        elif path == "/profile":
+            self._send(200, {"login": "someone"})
+        elif path == "/slow":
+            time.sleep(1)
+            self._send(200, {})
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class TestHttpClient:
+
+    def test_retries_transient_errors(self, stub_server):
+        """Test that 5xx responses are retried with backoff until they succeed."""
+        client = HttpClient(backoff_factor=0.01)
+        assert client.get_json(f"{stub_server}/flaky") == {"ok": True}
+        assert StubHandler.hits["/flaky"] == 3
+
+    def test_follows_pagination(self, stub_server):
+        """Test that every page linked through Link headers is fetched."""
+        client = HttpClient()
+        assert list(client.get_paginated(f"{stub_server}/pages")) == [10, 11, 20, 21, 30, 31]
+
+    def test_reads_last_page(self, stub_server):
+        """Test that the page count comes from the rel="last" link so the pages can be fetched concurrently."""
+        client = HttpClient()
+        assert client.last_page(client.get(f"{stub_server}/pages")) == 3
+        assert client.last_page(client.get(f"{stub_server}/pages?page=3")) == 1
+
+    def test_tracks_rate_limit_headers(self, stub_server):
+        """Test that the remaining quota comes from response headers, without probe calls."""
+        client = HttpClient()
+        client.get(f"{stub_server}/limited")
+        assert client.rate_limit_remaining == 0
+        assert client.rate_limit_reset > time.time()
+
+    def test_syncs_quota_from_headers(self, stub_server):
+        """Test that an exhausted upstream quota stops further calls instead of sleeping until the reset."""
+        client = HttpClient(quota=QuotaManager(capacity=5000, refill_per_second=5000 / 3600), quota_timeout=0.1)
+        client.get(f"{stub_server}/limited")
+        assert client.quota.available() == 0
+        with pytest.raises(QuotaExceeded):
+            client.get(f"{stub_server}/limited")
+
+    def test_caches_call_types_with_ttl(self, stub_server):
+        """Test that get_json serves call types with a TTL from the cache and leaves the others uncached."""
+        client = HttpClient(cache=MemoryCache(), cache_ttls={"user": 60})
+        for _ in range(3):
+            assert client.get_json(f"{stub_server}/profile", call_type="user") == {"login": "someone"}
+        assert StubHandler.hits["/profile"] == 1
+        client.get_json(f"{stub_server}/profile")
+        assert StubHandler.hits["/profile"] == 2
+
+    def test_times_out(self, stub_server):
+        """Test that the default timeout applies to every call."""
+        client = HttpClient(timeout=0.2, retries=0)
+        with pytest.raises(Exception):
+            client.get(f"{stub_server}/slow")
@@ -0,0 +1,54 @@
+import fakeredis
+import pytest
+
+from core.journal import MemoryJournal, RedisJournal
+
+
+@pytest.fixture
+def make_replica():
+    """Redis journals of replicas sharing a single fake server."""
+    server = fakeredis.FakeServer()
+
+    def _make(replica, lease_seconds=60):
+        return RedisJournal(fakeredis.FakeRedis(server=server, decode_responses=True), "mock", replica, lease_seconds)
+    return _make
+
+
+class TestRedisJournal:
+
+    def test_live_replicas_keep_their_entries(self, make_replica):
+        """Test that a starting replica doesn't take the unwritten rows of one that is still running."""
+        replica_a, replica_b = make_replica("a"), make_replica("b")
+        replica_a.record("entity_0", 3)
+        replica_b.record("entity_1", 1)
+
+        assert replica_b.recover() == []
+        assert replica_a.size() == 1 and replica_b.size() == 1
+
+    def test_dead_replica_recovered_once(self, make_replica):
+        """Test that the journal of a replica whose lease expired is drained by exactly one other replica."""
+        dead = make_replica("dead")
+        dead.record("entity_0", 3)
+        dead.record("entity_1", 1)
+        dead.client.delete(dead._lease_key("dead"))  # lease expired
+        replica_a, replica_b = make_replica("a"), make_replica("b")
+
+        assert sorted(replica_a.recover()) == [("entity_0", 3), ("entity_1", 1)]
+        assert replica_b.recover() == []
+        assert dead.size() == 0
+
+    def test_remove_written_entries(self, make_replica):
+        """Test that flushed rows leave the journal."""
+        journal = make_replica("a")
+        for i in range(3):
+            journal.record(f"entity_{i}", i)
+        journal.remove(["entity_0", "entity_2"])
+        assert journal.size() == 1
+
+
+def test_memory_journal_never_recovers():
+    """Test that an in-process journal, gone with its process, has nothing of other processes to recover."""
+    journal = MemoryJournal()
+    journal.record("entity_0", 3)
+    assert journal.recover() == []
+    assert journal.size() == 1
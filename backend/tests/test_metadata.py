@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+
+class TestMetadataRefresh:
+
+    def test_refresh_between_reconciles_skips_the_table(self, make_site_worker, monkeypatch):
+        """Test that refreshes are summarized from the rank index, following writes without scanning."""
+        worker = make_site_worker()
+        worker.rank_index.load([(1, 2), (5, 1)])
+        worker._metadata_reconciled_at = time.monotonic()
+
+        def no_scan(session):
+            raise AssertionError("scanned the site table")
+        monkeypatch.setattr(worker, "get_index_counts", no_scan)
+
+        snapshot = worker.refresh_metadata()
+        assert snapshot["current_entities"] == 3
+        assert snapshot["index_max"] == 5
+        assert snapshot["index_mean"] == pytest.approx(7 / 3)
+
+        worker.rank_index.update(None, 9)  # a write
+        snapshot = worker.refresh_metadata()
+        assert snapshot["current_entities"] == 4
+        assert snapshot["index_max"] == 9
+        assert worker.get_metadata() is snapshot
+
+    def test_reconcile_due_after_max_staleness(self, make_site_worker):
+        """Test that a refresh is due without pending writes only once a reconcile is."""
+        worker = make_site_worker()
+        assert worker.metadata_needs_refresh()
+
+        worker._metadata_reconciled_at = worker._metadata_refreshed_at = time.monotonic()
+        assert not worker.metadata_needs_refresh()
+        worker._metadata_reconciled_at -= worker.metadata_max_staleness_seconds
+        assert worker.metadata_needs_refresh()
@@ -0,0 +1,33 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from core import metrics
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels)
+
+
+class TestMetrics:
+
+    def test_timed_observes_and_counts_errors(self):
+        """Test that timed records every call and counts the failing ones."""
+        with metrics.timed("test-site", "entity_info"):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.timed("test-site", "entity_info"):
+                raise ValueError("upstream down")
+        assert sample("site_call_seconds_count", site="test-site", call="entity_info") == 2
+        assert sample("site_call_errors_total", site="test-site", call="entity_info") == 1
+
+    def test_gauge_function_sampled_on_scrape(self):
+        """Test that gauges read their value when scraped, and a failing sampler doesn't break the scrape."""
+        depth = [3]
+        metrics.gauge_function(metrics.QUEUE_DEPTH, lambda: depth[0], site="test-site", stage="fetch")
+        assert sample("crawl_queue_depth", site="test-site", stage="fetch") == 3
+        depth[0] = 7
+        assert sample("crawl_queue_depth", site="test-site", stage="fetch") == 7
+        metrics.gauge_function(metrics.QUEUE_DEPTH, lambda: 1 / 0, site="test-site", stage="expand")
+        body, content_type = metrics.render()
+        assert b'crawl_queue_depth{site="test-site",stage="expand"} NaN' in body
+        assert content_type.startswith("text/plain")
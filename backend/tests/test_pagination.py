@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import pytest
+
+from core.pagination import map_bounded
+
+
+class TestMapBounded:
+
+    def test_results_in_order(self):
+        """Test that results come back in the order of the items, whatever order the calls finish in."""
+        with ThreadPoolExecutor(4) as executor:
+            results = map_bounded(executor, lambda i: time.sleep((5 - i) * 0.01) or i * 10, range(5), max_in_flight=3)
+            assert list(results) == [0, 10, 20, 30, 40]
+
+    def test_bounded_in_flight(self):
+        """Test that no more than max_in_flight calls run at once."""
+        lock = Lock()
+        running, peak = [0], [0]
+
+        def fetch(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return item
+
+        with ThreadPoolExecutor(8) as executor:
+            assert len(list(map_bounded(executor, fetch, range(20), max_in_flight=3))) == 20
+        assert 1 < peak[0] <= 3
+
+    def test_consumes_items_lazily(self):
+        """Test that batches start while the items (e.g. page tokens) are still being produced."""
+        started = []
+
+        def pages():
+            for page in range(3):
+                yield page
+                time.sleep(0.05)
+                assert started, "first batch should start before the walk finishes"
+
+        with ThreadPoolExecutor(2) as executor:
+            assert list(map_bounded(executor, lambda page: started.append(page) or page, pages(), max_in_flight=2)) == [0, 1, 2]
+
+    def test_propagates_errors(self):
+        """Test that a failed call fails the whole fetch."""
+        def fetch(item):
+            if item == 2:
+                raise ValueError("bad page")
+            return item
+
+        with ThreadPoolExecutor(2) as executor:
+            with pytest.raises(ValueError):
+                list(map_bounded(executor, fetch, range(5), max_in_flight=2))
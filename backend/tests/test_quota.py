@@ -0,0 +1,91 @@
+import time
+from threading import Thread
+
+import fakeredis
+
+from core.quota import QuotaManager
+
+
+class TestQuotaManager:
+
+    def test_unlimited_without_capacity(self):
+        """Test that sites without a quota never wait."""
+        quota = QuotaManager()
+        assert not quota.limited
+        assert all(quota.try_reserve("search.list") for _ in range(1000))
+        assert quota.wait_time(10 ** 6) == 0
+
+    def test_costs_per_call_type(self):
+        """Test that each call type draws its own weight from the bucket."""
+        quota = QuotaManager(capacity=150, refill_per_second=0, costs={"search.list": 100})
+        assert quota.try_reserve("search.list")
+        assert not quota.try_reserve("search.list")
+        assert quota.try_reserve("channels.list")  # default cost of 1
+        assert 48 <= quota.available() <= 49
+
+    def test_refills_over_time(self):
+        """Test that spent budget comes back at the refill rate."""
+        quota = QuotaManager(capacity=10, refill_per_second=100)
+        assert quota.try_reserve(cost=10)
+        assert quota.wait_time(5) > 0
+        assert quota.reserve(timeout=1)
+        time.sleep(0.05)
+        assert quota.available() >= 4
+
+    def test_reserve_times_out(self):
+        """Test that reserve gives up instead of blocking past its timeout."""
+        quota = QuotaManager(capacity=1, refill_per_second=0.001)
+        assert quota.try_reserve()
+        start = time.monotonic()
+        assert not quota.reserve(timeout=0.2)
+        assert time.monotonic() - start < 1
+
+    def test_reserve_honours_stop(self):
+        """Test that a stopping crawl thread isn't held up by an empty bucket."""
+        quota = QuotaManager(capacity=1, refill_per_second=0.001)
+        quota.try_reserve()
+        assert not quota.reserve(should_stop=lambda: True)
+
+    def test_sync_pauses_until_reset(self):
+        """Test that an upstream report of zero remaining blocks calls until the reset, then refills fully."""
+        quota = QuotaManager(capacity=100, refill_per_second=100)
+        quota.sync(0, reset_at=time.time() + 1)
+        assert quota.available() == 0
+        assert quota.wait_time(1) > 0.5
+        granted = []
+        waiter = Thread(target=lambda: granted.append(quota.reserve(timeout=5)))
+        waiter.start()
+        waiter.join()
+        assert granted == [True]
+        assert quota.available() >= 98
+
+
+class TestSharedQuota:
+
+    @staticmethod
+    def replica(server, **kwargs):
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        return QuotaManager(capacity=100, refill_per_second=0.001, client=client, key="quota:mock", **kwargs)
+
+    def test_replicas_share_budget(self):
+        """Test that what one replica spends is gone for the others."""
+        server = fakeredis.FakeServer()
+        replica_a, replica_b = self.replica(server), self.replica(server)
+        assert replica_a.try_reserve(cost=60)
+        assert not replica_b.try_reserve(cost=60)
+        assert replica_b.try_reserve(cost=40)
+        assert replica_a.available() < 1
+
+    def test_survives_restart(self):
+        """Test that a restarted worker picks up the spent bucket instead of a full one."""
+        server = fakeredis.FakeServer()
+        self.replica(server).try_reserve(cost=90)
+        assert self.replica(server).available() < 11
+
+    def test_sync_pauses_replicas(self):
+        """Test that an upstream report of zero remaining blocks every replica until the reset."""
+        server = fakeredis.FakeServer()
+        self.replica(server).sync(0, reset_at=time.time() + 60)
+        replica = self.replica(server)
+        assert not replica.try_reserve()
+        assert replica.wait_time(1) > 55
@@ -0,0 +1,46 @@
+import random
+
+from core.rank import RankIndex
+
+
+class TestRankIndex:
+
+    def test_count_greater_matches_scan(self):
+        """Test that count_greater agrees with a linear count over the same values."""
+        values = [random.randint(0, 300) for _ in range(2000)]
+        rank_index = RankIndex(capacity=4)  # force a few resizes while loading
+        rank_index.load((value, values.count(value)) for value in set(values))
+
+        assert rank_index.total == len(values)
+        for probe in [-1, 0, 1, 50, 150, 299, 300, 1000]:
+            assert rank_index.count_greater(probe) == sum(1 for value in values if value > probe)
+
+    def test_update_moves_entities(self):
+        """Test that updates keep totals and counts consistent."""
+        rank_index = RankIndex()
+        rank_index.load([(1, 2), (5, 1)])
+        rank_index.update(None, 10)  # new entity
+        rank_index.update(1, 3)  # existing entity re-crawled
+
+        assert rank_index.total == 4
+        assert rank_index.count_greater(2) == 3
+        assert rank_index.count_greater(9) == 1
+
+    def test_index_counts_follow_updates(self):
+        """Test that index_counts lists the non-empty index values after loads and updates."""
+        rank_index = RankIndex(capacity=4)
+        rank_index.load([(1, 2), (5, 1)])
+        rank_index.update(5, 9)
+        rank_index.update(None, 1)
+
+        assert rank_index.index_counts() == [(1, 3), (9, 1)]
+
+    def test_value_at_rank_is_descending(self):
+        """Test that value_at_rank walks the values from highest to lowest index."""
+        values = [random.randint(0, 100) for _ in range(500)]
+        rank_index = RankIndex()
+        rank_index.load((value, values.count(value)) for value in set(values))
+
+        expected = sorted(values, reverse=True)
+        assert [rank_index.value_at_rank(rank) for rank in range(len(values))] == expected
+        assert rank_index.value_at_rank(len(values)) is None
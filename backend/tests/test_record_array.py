@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sites.types import RecordArray
+
+
+class TestRecordArray:
+
+    def test_metric_only_columns_stay_unallocated(self):
+        """Test that records without link, description or created_at only fill the metrics array."""
+        records = RecordArray("citations")
+        for metric in (3, 1, 4):
+            records.append(metric)
+        assert len(records) == 3
+        assert list(records) == [3, 1, 4]
+        assert records.links is None and records.descriptions is None and records.created_at is None
+        assert list(records.rows()) == [(3, None, None, None), (1, None, None, None), (4, None, None, None)]
+
+    def test_columns_allocated_lazily(self):
+        """Test that a column is allocated at the first record providing it, padded for the earlier ones."""
+        records = RecordArray()
+        records.append(1)
+        records.append(2, link="https://example.com/2")
+        created_at = datetime(2024, 1, 1)
+        records.append(3, created_at=created_at)
+        assert records.links == [None, "https://example.com/2", None]
+        assert records.created_at == [None, None, created_at]
+        assert records.descriptions is None
+        assert list(records.rows()) == [
+            (1, None, None, None),
+            (2, "https://example.com/2", None, None),
+            (3, None, None, created_at),
+        ]
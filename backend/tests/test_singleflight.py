@@ -0,0 +1,85 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Thread
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+
+def slow_crawl(calls, result="entity", delay=0.1):
+    def crawl():
+        calls.append(1)
+        time.sleep(delay)
+        return result
+    return crawl
+
+
+class TestSingleFlight:
+
+    def test_do_coalesces_concurrent_calls(self):
+        """Test that concurrent calls for one key run the function once and all get its result."""
+        flight, calls, results = SingleFlight(), [], []
+        barrier = Barrier(5)
+        crawl = slow_crawl(calls)
+
+        def request():
+            barrier.wait()
+            results.append(flight.do("bob", crawl))
+
+        threads = [Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == ["entity"] * 5
+        assert not flight.in_flight("bob")
+
+    def test_distinct_keys_run_separately(self):
+        """Test that different keys don't wait on each other."""
+        flight, calls = SingleFlight(), []
+        with ThreadPoolExecutor(2) as executor:
+            futures = [flight.submit(executor, key, slow_crawl(calls)) for key in ("a", "b")]
+            assert [future.result() for future in futures] == ["entity", "entity"]
+        assert len(calls) == 2
+
+    def test_submit_shares_future(self):
+        """Test that submit hands every caller the in-flight future without taking extra threads."""
+        flight, calls = SingleFlight(), []
+        with ThreadPoolExecutor(1) as executor:
+            futures = [flight.submit(executor, ("github", "bob"), slow_crawl(calls)) for _ in range(10)]
+            assert all(future is futures[0] for future in futures)
+            assert futures[0].result() == "entity"
+        assert len(calls) == 1
+
+    def test_exceptions_reach_every_waiter(self):
+        """Test that a failed call fails all its waiters and the next call runs again."""
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.05)
+            raise ValueError("upstream down")
+
+        with ThreadPoolExecutor(1) as executor:
+            futures = [flight.submit(executor, "bob", failing) for _ in range(3)]
+            for future in futures:
+                with pytest.raises(ValueError):
+                    future.result()
+        assert flight.do("bob", lambda: "recovered") == "recovered"
+
+    def test_async_waiters(self):
+        """Test the event loop usage in main: shielded wrap_future waiters sharing one call."""
+        flight, calls = SingleFlight(), []
+        executor = ThreadPoolExecutor(2)
+
+        async def lookup():
+            return await asyncio.shield(asyncio.wrap_future(flight.submit(executor, "bob", slow_crawl(calls))))
+
+        async def burst():
+            return await asyncio.gather(*(lookup() for _ in range(20)))
+
+        assert asyncio.run(burst()) == ["entity"] * 20
+        assert len(calls) == 1
+        executor.shutdown()
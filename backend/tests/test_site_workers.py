@@ -54,3 +54,12 @@ class TestSiteWorkers:
             except Exception as e:
                 pytest.fail(f"Failed to initialize worker for {site_name}: {str(e)}")
 
+
+    def test_site_worker_initialization_is_lazy(self, site_workers):
+        """Test that constructing site workers doesn't start crawl threads or build SDK clients."""
+        for site_name, worker in site_workers.items():
+            assert not any(thread.is_alive() for thread in worker._monitor_threads), \
+                f"{site_name} started its crawl pool on construction"
+            for client in ('client', 'reddit_client'):
+                assert client not in vars(worker), \
+                    f"{site_name} built its {client} on construction"
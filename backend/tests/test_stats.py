@@ -0,0 +1,37 @@
+import statistics
+
+import pytest
+
+from core.stats import summarize_index_counts
+
+
+class TestSummarizeIndexCounts:
+
+    def test_empty(self):
+        """Test that a site without entities has no summary, zero counts included."""
+        assert summarize_index_counts([]) is None
+        assert summarize_index_counts([(3, 0), (5, 0)]) is None
+
+    def test_single_value(self):
+        """Test that a single index value gives a degenerate summary instead of dividing by zero."""
+        summary = summarize_index_counts([(7, 1)])
+        assert summary["current_entities"] == 1
+        assert summary["index_min"] == summary["index_max"] == 7
+        assert summary["index_mean"] == summary["index_median"] == summary["1q"] == summary["3q"] == 7
+        assert summary["index_stddev"] == 0
+        assert [bucket["count"] for bucket in summary["histogram"]] == [1] + [0] * 9
+        assert summary["histogram"][0]["percentage"] == 100
+
+    def test_matches_expanded_population(self):
+        """Test that the statistics agree with the ones computed over one row per entity, like postgres would."""
+        index_counts = [(10, 2), (0, 5), (3, 4), (42, 1)]
+        values = [value for value, count in index_counts for _ in range(count)]
+        summary = summarize_index_counts(index_counts)
+        assert summary["current_entities"] == len(values)
+        assert (summary["index_min"], summary["index_max"]) == (0, 42)
+        assert summary["index_mean"] == pytest.approx(statistics.mean(values))
+        assert summary["index_stddev"] == pytest.approx(statistics.stdev(values))
+        assert summary["index_median"] == pytest.approx(statistics.median(values))
+        assert (summary["1q"], summary["3q"]) == pytest.approx(statistics.quantiles(values, n=4, method="inclusive")[::2])
+        assert sum(bucket["count"] for bucket in summary["histogram"]) == len(values)
+        assert summary["histogram"][-1]["count"] == 1  # the max lands in the last bucket
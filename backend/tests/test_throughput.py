@@ -0,0 +1,22 @@
+from core import throughput
+from core.throughput import ThroughputMeter
+
+
+class TestThroughputMeter:
+
+    def test_window_rollover(self, monkeypatch):
+        """Test that events stop counting towards the rate once they leave the window, but stay in the total."""
+        clock = [100.0]
+        monkeypatch.setattr(throughput.time, "monotonic", lambda: clock[0])
+        meter = ThroughputMeter(window_seconds=10)
+        for _ in range(5):
+            meter.mark()
+        clock[0] += 6
+        for _ in range(5):
+            meter.mark()
+        assert meter.rate() == 1.0
+        clock[0] += 4  # the first five are exactly window_seconds old
+        assert meter.rate() == 0.5
+        clock[0] += 6
+        assert meter.rate() == 0
+        assert meter.total == 10
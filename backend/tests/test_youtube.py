@@ -0,0 +1,82 @@
+from sites.types import RequestEntity
+from sites.youtube import Youtube
+
+
+class FakeRequest:
+    def __init__(self, calls, call_type, response, **params):
+        self.calls = calls
+        self.call_type = call_type
+        self.response = response
+        self.params = params
+        self.uri = f"{call_type}?{sorted(params.items())}"
+
+    def execute(self, http=None):
+        self.calls.append((self.call_type, self.params))
+        return self.response
+
+
+class FakeResource:
+    def __init__(self, client, resource):
+        self.client = client
+        self.resource = resource
+
+    def list(self, **params):
+        call_type = f"{self.resource}.list"
+        return FakeRequest(self.client.calls, call_type, self.client.respond(call_type, params), **params)
+
+
+class FakeYoutubeClient:
+    """Data API stand-in: a parent channel whose topic search finds three related channels with one upload each."""
+
+    def __init__(self):
+        self.calls = []
+        self.channels_by_id = {
+            f"UC{handle}": self.channel(f"UC{handle}", handle) for handle in ("related_a", "related_b", "related_c")
+        }
+
+    @staticmethod
+    def channel(channel_id, handle):
+        return {
+            "id": channel_id,
+            "contentDetails": {"relatedPlaylists": {"uploads": f"UU{handle}"}},
+            "snippet": {"customUrl": f"@{handle}", "publishedAt": "2020-01-01T00:00:00+00:00"},
+            "topicDetails": {"topicCategories": ["https://en.wikipedia.org/wiki/Music"]},
+        }
+
+    def respond(self, call_type, params):
+        if call_type == "channels.list" and "forHandle" in params:
+            return {"items": [self.channel("UCparent", params["forHandle"])]}
+        if call_type == "channels.list":
+            return {"items": [self.channels_by_id[channel_id] for channel_id in params["id"].split(",")]}
+        if call_type == "search.list":
+            return {"items": [{"id": {"channelId": channel_id}} for channel_id in self.channels_by_id]}
+        if call_type == "playlistItems.list":
+            video_id = f"video_of_{params['playlistId']}"
+            return {"items": [{"contentDetails": {"videoId": video_id, "videoPublishedAt": "2024-01-01T00:00:00+00:00"}}]}
+        if call_type == "videos.list":
+            return {"items": [{"id": video_id, "statistics": {"viewCount": "5000000"}} for video_id in params["id"].split(",")]}
+        raise AssertionError(f"unexpected call {call_type}")
+
+    def __getattr__(self, resource):
+        return lambda: FakeResource(self, resource)
+
+
+class TestYoutubeChannelBatching:
+
+    def test_related_channels_fetched_in_one_batch_and_reused(self, make_site_worker):
+        """Test that related channels come from one batched channels.list, which their own crawls then reuse."""
+        worker = make_site_worker(Youtube)
+        worker.client = FakeYoutubeClient()
+
+        related = worker.get_related_entities(RequestEntity(type=worker.name, identifier="parent"))
+        assert [entity.identifier for entity in related] == ["related_a", "related_b", "related_c"]
+        channel_calls = [params for call_type, params in worker.client.calls if call_type == "channels.list"]
+        assert channel_calls == [
+            {"forHandle": "parent", "part": Youtube.CHANNEL_PARTS},
+            {"id": "UCrelated_a,UCrelated_b,UCrelated_c", "part": Youtube.CHANNEL_PARTS},
+        ]
+
+        for entity in related:
+            entity_info = worker.entity_info(entity)
+            assert worker.calculate_h_index(entity_info.records) == (1, 5)
+        assert sum(1 for call_type, _ in worker.client.calls if call_type == "channels.list") == 2
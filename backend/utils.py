@@ -1,34 +1,44 @@
-from typing import List, Dict, Type
+from typing import List, Dict, Type, Optional
+from concurrent.futures import ThreadPoolExecutor
 import os
 import importlib
 
 from sites import SiteWorker
 
 
+def load_site_worker(item: str) -> Optional[SiteWorker]:
+    """Import the site package `item` (e.g. 'reddit') and construct its SiteWorker, None if it has none."""
+    try:
+        # Import the module (e.g., 'sites.reddit')
+        module = importlib.import_module(f'sites.{item}')
+    except ImportError as e:
+        print(f"Failed to load site worker {item}: {e}")
+        return None
+
+    # Look for a class that inherits from SiteWorker
+    for attr_name in dir(module):
+        attr = getattr(module, attr_name)
+        if (isinstance(attr, type) and 
+            issubclass(attr, SiteWorker) and 
+            attr != SiteWorker):
+            return attr()
+    return None
+
+
 def load_site_workers() -> Dict[str, Type[SiteWorker]]:
-    site_workers = {}
+    """
+    Construct every site worker, in parallel. Constructors don't touch the database or the
+    site APIs (see db.migrate and the lazy SDK clients), nor start the crawl pools.
+    """
     sites_dir = os.path.join(os.path.dirname(__file__), 'sites')
     
     # Skip these directories/files when scanning for site workers
     exclude = {'__pycache__', '__init__.py', 'types.py'}
-    
-    for item in os.listdir(sites_dir):
-        if item in exclude or not os.path.isdir(os.path.join(sites_dir, item)):
-            continue
-            
-        try:
-            # Import the module (e.g., 'sites.reddit')
-            module = importlib.import_module(f'sites.{item}')
-            
-            # Look for a class that inherits from SiteWorker
-            for attr_name in dir(module):
-                attr = getattr(module, attr_name)
-                if (isinstance(attr, type) and 
-                    issubclass(attr, SiteWorker) and 
-                    attr != SiteWorker):
-                    site_workers[item] = attr()
-                    break
-        except ImportError as e:
-            print(f"Failed to load site worker {item}: {e}")
-    
-    return site_workers
\ No newline at end of file
+    items = [
+        item for item in sorted(os.listdir(sites_dir))
+        if item not in exclude and os.path.isdir(os.path.join(sites_dir, item))
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(len(items), 1), thread_name_prefix="load-site") as executor:
+        workers = executor.map(load_site_worker, items)
+        return {item: worker for item, worker in zip(items, workers) if worker is not None}